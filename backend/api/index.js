@@ -292,6 +292,8 @@ app.post('/api/upload', authenticateJWT, anomalyDetectionMiddleware, async (req,
                         document_id: result.rows[0].id,
                         uploaded_at: new Date().toISOString()
                     };
+                    // Dedup set shared with backend/worker/requeue.py; the worker removes the id on pop
+                    await redis.sadd('document_jobs:queued', String(result.rows[0].id));
                     await redis.lpush('document_jobs', JSON.stringify(jobData));
                     fs.unlinkSync(filePath);
 
@@ -0,0 +1,18 @@
+-- Lease-based document claiming for the indexing worker
+-- A worker claims documents by setting status='processing' plus a lease; rows whose
+-- lease expired (worker crashed or stalled) become claimable again.
+
+BEGIN;
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS lease_owner TEXT;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;
+
+-- Claim query: WHERE org_id = ? AND status IN ('pending', 'processing') ORDER BY created_at
+CREATE INDEX IF NOT EXISTS idx_documents_org_status_created ON documents(org_id, status, created_at);
+
+COMMENT ON COLUMN documents.lease_owner IS 'Worker (host:pid) currently holding the indexing lease';
+COMMENT ON COLUMN documents.lease_expires_at IS 'Lease expiry; after this the document may be reclaimed by another worker';
+COMMENT ON COLUMN documents.heartbeat_at IS 'Last lease renewal by the owning worker';
+
+COMMIT;
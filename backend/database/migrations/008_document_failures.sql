@@ -0,0 +1,21 @@
+-- Per-attempt indexing failure records
+-- Written by the worker in the same transaction as the bulk status update, so
+-- documents only carry their current status and the error history lives here.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS document_failures (
+    id BIGSERIAL PRIMARY KEY,
+    document_id INTEGER NOT NULL,
+    org_id INTEGER,
+    status TEXT NOT NULL,          -- failed, rejected_toxic, or released (returned to pending for retry)
+    stage TEXT,                    -- extract, moderation, embed, index
+    error TEXT,
+    worker TEXT,                   -- lease owner (host:pid) that recorded the failure
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_document_failures_document ON document_failures(document_id);
+CREATE INDEX IF NOT EXISTS idx_document_failures_org_created ON document_failures(org_id, created_at DESC);
+
+COMMIT;
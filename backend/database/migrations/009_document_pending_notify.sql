@@ -0,0 +1,27 @@
+-- Event-driven indexing: notify the worker when documents become pending
+-- The worker LISTENs on 'documents_pending' (payload = org_id) and dispatches
+-- indexing immediately; Postgres folds duplicate notifications within a
+-- transaction, so a bulk import produces one wake-up per org.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION notify_document_pending() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('documents_pending', COALESCE(NEW.org_id::text, ''));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS documents_pending_insert ON documents;
+CREATE TRIGGER documents_pending_insert
+    AFTER INSERT ON documents
+    FOR EACH ROW WHEN (NEW.status = 'pending')
+    EXECUTE FUNCTION notify_document_pending();
+
+DROP TRIGGER IF EXISTS documents_pending_reset ON documents;
+CREATE TRIGGER documents_pending_reset
+    AFTER UPDATE OF status ON documents
+    FOR EACH ROW WHEN (NEW.status = 'pending' AND OLD.status IS DISTINCT FROM 'pending')
+    EXECUTE FUNCTION notify_document_pending();
+
+COMMIT;
@@ -0,0 +1,14 @@
+-- RBAC partition registry (RBAC_PARTITIONS=true)
+-- A base collection (privacy_documents_<org>) is listed here once its existing
+-- chunks have been copied into its __al_* / __user_* partitions; only then are
+-- student and general-role searches routed to the partitions.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS vector_partitions (
+    base_collection TEXT PRIMARY KEY,
+    chunks_copied INTEGER DEFAULT 0,
+    ready_at TIMESTAMP
+);
+
+COMMIT;
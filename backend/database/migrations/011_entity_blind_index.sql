@@ -0,0 +1,16 @@
+-- Keyed blind index for exact entity-ID lookup in hybrid search.
+-- token = HMAC-SHA256(BLIND_INDEX_KEY, upper-cased ID); IDs are never stored in clear.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS entity_blind_index (
+    collection_name TEXT NOT NULL,
+    token CHAR(64) NOT NULL,
+    chunk_id TEXT NOT NULL,
+    document_id TEXT,
+    PRIMARY KEY (collection_name, token, chunk_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_blind_index_chunk ON entity_blind_index(collection_name, chunk_id);
+CREATE INDEX IF NOT EXISTS idx_blind_index_document ON entity_blind_index(collection_name, document_id);
+
+COMMIT;
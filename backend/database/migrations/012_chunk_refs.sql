@@ -0,0 +1,15 @@
+-- Documents referencing each content-addressed chunk (CHUNK_DEDUP).
+-- A vector is deleted when its last reference goes.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS chunk_refs (
+    collection_name TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (collection_name, chunk_id, document_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_chunk_refs_document ON chunk_refs(collection_name, document_id);
+
+COMMIT;
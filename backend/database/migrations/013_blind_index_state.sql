@@ -0,0 +1,17 @@
+-- Collections whose stored chunks have all been scanned into entity_blind_index.
+-- Startup only rebuilds collections missing here, including ones that
+-- legitimately contain no entity IDs (and therefore no index rows).
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS entity_blind_index_state (
+    collection_name TEXT PRIMARY KEY,
+    chunks_scanned INTEGER DEFAULT 0,
+    completed_at TIMESTAMP
+);
+
+-- Collections indexed before this table existed
+INSERT INTO entity_blind_index_state (collection_name, completed_at)
+SELECT DISTINCT collection_name, NOW() FROM entity_blind_index
+ON CONFLICT DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,12 @@
+-- Orgs whose indexing was paused by cancelling their ingestion job.
+-- The scheduler skips them until processing is requested again (POST
+-- /process-batch) or a document is uploaded after paused_at.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ingestion_paused_orgs (
+    org_id INTEGER PRIMARY KEY,
+    job_id TEXT,
+    paused_at TIMESTAMP DEFAULT NOW()
+);
+
+COMMIT;
@@ -0,0 +1,137 @@
+import io
+import csv
+import json
+import random
+from typing import Dict, List, Optional, Tuple
+
+# Kinds of synthetic documents the benchmark can generate:
+#   records - CSV-import rows: no file, text comes from the documents.metadata JSON
+#   csv     - uploaded CSV files stored in the object store
+#   pdf     - uploaded multi-page PDFs stored in the object store
+CORPUS_KINDS = ("records", "csv", "pdf")
+
+_FIRST = ["Aarav", "Diya", "Ishaan", "Meera", "Rohan", "Ananya", "Kabir", "Saanvi", "Arjun", "Priya",
+          "Vikram", "Nisha", "Aditya", "Kavya", "Rahul", "Sneha", "Karan", "Pooja", "Siddharth", "Riya"]
+_LAST = ["Sharma", "Iyer", "Reddy", "Nair", "Gupta", "Rao", "Menon", "Patel", "Kulkarni", "Das"]
+_DEPARTMENTS = ["Computer Science", "Electronics", "Mechanical", "Civil", "Biotechnology", "Mathematics"]
+_CITIES = [("Bengaluru", "560085"), ("Mysuru", "570001"), ("Chennai", "600036"), ("Hyderabad", "500032")]
+_WORDS = ("privacy data student faculty course semester research policy record grade campus library "
+          "department committee schedule examination report system network access review security").split()
+
+
+def make_record(rng: random.Random, index: int) -> Dict[str, str]:
+    """One student row shaped like the CSV imports (same fields the search path relies on)."""
+    first, last = rng.choice(_FIRST), rng.choice(_LAST)
+    city, pincode = rng.choice(_CITIES)
+    return {
+        "student_id": f"PES{rng.randint(1, 2)}UG{rng.randint(20, 24)}CS{index:04d}",
+        "name": f"{first} {last}",
+        "email": f"{first.lower()}.{last.lower()}{index}@example.edu",
+        "phone": f"9{rng.randint(100000000, 999999999)}",
+        "department": rng.choice(_DEPARTMENTS),
+        "semester": str(rng.randint(1, 8)),
+        "cgpa": f"{rng.uniform(5.0, 10.0):.2f}",
+        "address": f"{rng.randint(1, 999)} {rng.choice(_LAST)} Road, {city} {pincode}",
+        "record_type": "student",
+        "row_index": str(index),
+    }
+
+
+def make_csv_bytes(rows: List[Dict[str, str]]) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode("utf-8")
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf_bytes(pages: List[List[str]]) -> bytes:
+    """Minimal PDF (Helvetica text, one content stream per page) that pypdf can read."""
+    objects: List[bytes] = []
+    page_ids = []
+    font_id = 3
+    next_id = 4
+    for lines in pages:
+        body = ["BT", "/F1 10 Tf", "12 TL", "50 760 Td"]
+        for line in lines:
+            body.append(f"({_pdf_escape(line)}) Tj T*")
+        body.append("ET")
+        stream = "\n".join(body).encode("latin-1", "replace")
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects.append(b"%d 0 obj\n<< /Length %d >>\nstream\n%s\nendstream\nendobj\n" % (content_id, len(stream), stream))
+        objects.append((f"{page_id} 0 obj\n<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                        f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>\nendobj\n").encode())
+        page_ids.append(page_id)
+
+    header = [
+        b"1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n",
+        (f"2 0 obj\n<< /Type /Pages /Kids [{' '.join(f'{p} 0 R' for p in page_ids)}] /Count {len(page_ids)} >>\nendobj\n").encode(),
+        b"3 0 obj\n<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>\nendobj\n",
+    ]
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for obj in header + objects:
+        offsets.append(out.tell())
+        out.write(obj)
+    xref_at = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref_at))
+    return out.getvalue()
+
+
+def _paragraph_lines(rng: random.Random, lines: int) -> List[str]:
+    return [" ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 14))).capitalize() + "." for _ in range(lines)]
+
+
+class BenchDocument:
+    """One row of the fake documents table (CLAIM_COLUMNS plus org and status)."""
+
+    def __init__(self, doc_id: int, org_id: int, kind: str, filename: str,
+                 metadata: Optional[Dict] = None, file_key: Optional[str] = None):
+        self.id = doc_id
+        self.org_id = org_id
+        self.kind = kind
+        self.filename = filename
+        self.metadata = metadata
+        self.file_key = file_key
+        self.status = "pending"
+        self.lease_owner: Optional[str] = None
+
+    def claim_row(self) -> Tuple:
+        return (self.id, self.filename, json.dumps(self.metadata) if self.metadata is not None else None,
+                self.file_key, False, None, None, None, None)
+
+
+def build_corpus(kind: str, count: int, org_id: int = 1, seed: int = 7,
+                 csv_rows: int = 20, pdf_pages: int = 3) -> Tuple[List[BenchDocument], Dict[str, bytes]]:
+    """Deterministic corpus: (documents, object-store contents keyed by file_key).
+    kind is one of CORPUS_KINDS or 'mixed' (equal thirds)."""
+    rng = random.Random(seed)
+    documents: List[BenchDocument] = []
+    objects: Dict[str, bytes] = {}
+    kinds = CORPUS_KINDS if kind == "mixed" else (kind,)
+    for i in range(count):
+        doc_id = i + 1
+        doc_kind = kinds[i % len(kinds)]
+        if doc_kind == "records":
+            documents.append(BenchDocument(doc_id, org_id, doc_kind, f"students_{doc_id}.csv",
+                                           metadata=make_record(rng, doc_id)))
+        elif doc_kind == "csv":
+            key = f"bench/{org_id}/students_{doc_id}.csv"
+            objects[key] = make_csv_bytes([make_record(rng, doc_id * 1000 + r) for r in range(csv_rows)])
+            documents.append(BenchDocument(doc_id, org_id, doc_kind, f"students_{doc_id}.csv", metadata={}, file_key=key))
+        elif doc_kind == "pdf":
+            key = f"bench/{org_id}/report_{doc_id}.pdf"
+            objects[key] = make_pdf_bytes([_paragraph_lines(rng, 55) for _ in range(pdf_pages)])
+            documents.append(BenchDocument(doc_id, org_id, doc_kind, f"report_{doc_id}.pdf", metadata={}, file_key=key))
+        else:
+            raise ValueError(f"unknown corpus kind '{doc_kind}' (choose from {', '.join(CORPUS_KINDS)} or mixed)")
+    return documents, objects
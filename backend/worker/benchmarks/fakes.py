@@ -0,0 +1,494 @@
+"""
+In-process stand-ins for the services the ingestion path talks to, each with
+configurable latency, so the real worker code can be benchmarked without the
+docker stack:
+
+- FakeOllamaServer: a real HTTP server speaking /api/tags and /api/embeddings
+  (the worker's requests + EmbeddingClient path is exercised unchanged)
+- FakeChromaClient: chromadb.HttpClient replacement storing vectors in memory
+- FakeMinio: object store serving the generated corpus
+- FakeDocumentTable / BenchLeaseManager / fake_job_connection: the documents
+  table, lease transactions and job checkpoints, charging one round trip per
+  statement
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from ingestion.leases import LeaseManager
+from lib.chunk_refs import ChunkRefs
+
+
+class Latency:
+    """base + per_unit * units, with +/- jitter (fraction of the total)."""
+
+    def __init__(self, base_ms: float = 0.0, per_unit_ms: float = 0.0, jitter: float = 0.1):
+        self.base_ms = base_ms
+        self.per_unit_ms = per_unit_ms
+        self.jitter = jitter
+
+    def sleep(self, units: float = 1.0):
+        delay = (self.base_ms + self.per_unit_ms * units) / 1000.0
+        if delay <= 0:
+            return
+        if self.jitter:
+            delay *= random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        time.sleep(delay)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"base_ms": self.base_ms, "per_unit_ms": self.per_unit_ms, "jitter": self.jitter}
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values: Dict[str, float] = {}
+
+    def add(self, key: str, value: float = 1):
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.values)
+
+
+# ----------------------------------------------------------------------
+# Ollama
+# ----------------------------------------------------------------------
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Deterministic unit vector derived from the text."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8", "ignore")).digest())
+    vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = sum(v * v for v in vec) ** 0.5 or 1.0
+    return [v / norm for v in vec]
+
+
+class FakeOllamaServer:
+    """
+    Serves embeddings over HTTP on 127.0.0.1. At most `parallel` requests are
+    computed at once (like OLLAMA_NUM_PARALLEL); the rest wait, so latency grows
+    under load the way the real backend's does. `error_rate` answers that share
+    of requests with 503.
+    """
+
+    def __init__(self, latency: Latency, dim: int = 768, parallel: int = 4,
+                 error_rate: float = 0.0, model: str = "nomic-embed-text"):
+        self.latency = latency
+        self.dim = dim
+        self.error_rate = error_rate
+        self.model = model
+        self.counter = Counter()
+        self._slots = threading.BoundedSemaphore(max(1, parallel))
+        self.parallel = parallel
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: Any):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path.startswith("/api/tags"):
+                    self._reply(200, {"models": [{"name": f"{fake.model}:latest"}]})
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._reply(400, {"error": "bad json"})
+                    return
+                if not self.path.startswith("/api/embed"):
+                    self._reply(404, {"error": "not found"})
+                    return
+                text = body.get("input") or body.get("prompt") or ""
+                if isinstance(text, list):
+                    text = text[0] if text else ""
+                fake.counter.add("requests")
+                if fake.error_rate and random.random() < fake.error_rate:
+                    fake.counter.add("errors")
+                    self._reply(503, {"error": "server busy"})
+                    return
+                queued = time.perf_counter()
+                with fake._slots:
+                    fake.counter.add("queue_seconds", time.perf_counter() - queued)
+                    fake.latency.sleep(len(text) / 1000.0)
+                    embedding = fake_embedding(text, fake.dim)
+                fake.counter.add("texts")
+                self._reply(200, {"embedding": embedding})
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+# ----------------------------------------------------------------------
+# Chroma
+# ----------------------------------------------------------------------
+class FakeCollection:
+    """Keeps ids, documents and metadatas in memory. The request payload is
+    JSON-encoded per call to account for the HTTP client's serialization cost."""
+
+    def __init__(self, name: str, metadata: Optional[Dict], latency: Latency, counter: Counter):
+        self.name = name
+        self.metadata = metadata or {}
+        self.latency = latency
+        self.counter = counter
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, ids, embeddings=None, documents=None, metadatas=None):
+        json.dumps({"ids": ids, "embeddings": embeddings, "documents": documents, "metadatas": metadatas})
+        self.latency.sleep(len(ids))
+        with self._lock:
+            for i, item_id in enumerate(ids):
+                self._items[item_id] = {
+                    "document": documents[i] if documents else None,
+                    "metadata": metadatas[i] if metadatas else None,
+                }
+        self.counter.add("add_calls")
+        self.counter.add("vectors_added", len(ids))
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.add(ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids=None, where=None):
+        json.dumps({"ids": ids, "where": where})
+        self.latency.sleep(0)
+        with self._lock:
+            for item_id in ids or []:
+                self._items.pop(item_id, None)
+        self.counter.add("delete_calls")
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        with self._lock:
+            keys = list(ids) if ids else list(self._items)
+            found = [k for k in keys if k in self._items][offset or 0:]
+            if limit:
+                found = found[:limit]
+            return {"ids": found,
+                    "documents": [self._items[k]["document"] for k in found],
+                    "metadatas": [self._items[k]["metadata"] for k in found]}
+
+
+class FakeChromaClient:
+    def __init__(self, latency: Latency, *args, **kwargs):
+        self.latency = latency
+        self.counter = Counter()
+        self._collections: Dict[str, FakeCollection] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None, **kwargs) -> FakeCollection:
+        self.latency.sleep(0)
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollection(name, metadata, self.latency, self.counter)
+            return self._collections[name]
+
+    def get_collection(self, name: str, **kwargs) -> FakeCollection:
+        with self._lock:
+            return self._collections[name]
+
+    def list_collections(self) -> List[FakeCollection]:
+        with self._lock:
+            return list(self._collections.values())
+
+    def heartbeat(self) -> int:
+        return int(time.time() * 1e9)
+
+    def reset_data(self):
+        with self._lock:
+            self._collections.clear()
+
+
+# ----------------------------------------------------------------------
+# MinIO
+# ----------------------------------------------------------------------
+class FakeMinio:
+    """Serves `objects` (key -> bytes); latency units are KiB transferred."""
+
+    def __init__(self, objects: Dict[str, bytes], latency: Latency):
+        self.objects = objects
+        self.latency = latency
+        self.counter = Counter()
+
+    def bucket_exists(self, bucket: str) -> bool:
+        return True
+
+    def make_bucket(self, bucket: str):
+        pass
+
+    def fget_object(self, bucket: str, key: str, path: str):
+        data = self.objects.get(key)
+        if data is None:
+            self.latency.sleep(0)
+            self.counter.add("misses")
+            raise FileNotFoundError(f"NoSuchKey: {bucket}/{key}")
+        self.latency.sleep(len(data) / 1024.0)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.counter.add("downloads")
+        self.counter.add("bytes", len(data))
+
+
+# ----------------------------------------------------------------------
+# Postgres
+# ----------------------------------------------------------------------
+class FakeDocumentTable:
+    """The documents table. Every statement costs one `latency` round trip."""
+
+    def __init__(self, documents: Iterable, latency: Latency):
+        self.latency = latency
+        self.counter = Counter()
+        self._docs = {d.id: d for d in documents}
+        self._lock = threading.Lock()
+
+    def round_trip(self, statements: int = 1):
+        for _ in range(statements):
+            self.latency.sleep(0)
+        self.counter.add("statements", statements)
+
+    def reset(self):
+        with self._lock:
+            for doc in self._docs.values():
+                doc.status = "pending"
+                doc.lease_owner = None
+
+    def all(self) -> List:
+        with self._lock:
+            return list(self._docs.values())
+
+    def get(self, doc_id: int):
+        return self._docs.get(doc_id)
+
+    def status_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for doc in self._docs.values():
+                counts[doc.status] = counts.get(doc.status, 0) + 1
+        return counts
+
+    def pending(self, org_id: int) -> int:
+        with self._lock:
+            return sum(1 for d in self._docs.values() if d.org_id == org_id and d.status == "pending")
+
+
+class _FakeCursor:
+    def __init__(self, table: FakeDocumentTable):
+        self.table = table
+        self.description = []
+
+    def execute(self, sql, params=None):
+        self.table.round_trip()
+
+    def fetchall(self):
+        return []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FakeConnection:
+    def __init__(self, table: FakeDocumentTable):
+        self.table = table
+
+    def cursor(self):
+        return _FakeCursor(self.table)
+
+    def commit(self):
+        self.table.round_trip()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def fake_job_connection(table: FakeDocumentTable):
+    """Connection factory for IngestionJobStore (job rows are not kept)."""
+    return lambda: _FakeConnection(table)
+
+
+class BenchLeaseManager(LeaseManager):
+    """
+    LeaseManager over the fake table. Round trips mirror the real statements:
+    claim = UPDATE ... RETURNING + COMMIT; complete = one status UPDATE, one failure
+    INSERT (when there are failures), anything `before_commit` runs, then COMMIT.
+    """
+
+    def __init__(self, table: FakeDocumentTable, owner: str = "bench", **kwargs):
+        super().__init__(get_conn=lambda: None, put_conn=lambda conn: None, owner=owner, **kwargs)
+        self.table = table
+
+    def claim(self, org_id: int, limit: int, newest_first: bool = False) -> List[tuple]:
+        self.table.round_trip(2)
+        with self.table._lock:
+            candidates = [d for d in self.table._docs.values() if d.org_id == org_id and d.status == "pending"]
+            candidates.sort(key=lambda d: d.id, reverse=newest_first)
+            picked = candidates[:max(0, limit)]
+            for doc in picked:
+                doc.status, doc.lease_owner = "processing", self.owner
+        self._hold(d.id for d in picked)
+        return [d.claim_row() for d in picked]
+
+    def claim_document(self, doc_id: Optional[int] = None, file_key: Optional[str] = None) -> Optional[tuple]:
+        self.table.round_trip(2)
+        with self.table._lock:
+            doc = self.table._docs.get(doc_id) if doc_id else next(
+                (d for d in self.table._docs.values() if d.file_key == file_key), None)
+            if not doc or doc.status != "pending":
+                return None
+            doc.status, doc.lease_owner = "processing", self.owner
+        self._hold([doc.id])
+        return doc.claim_row()
+
+    def complete(self, outcomes: List[Dict[str, Any]], before_commit=None) -> int:
+        if not outcomes:
+            return 0
+        failures = any(o["status"] != "processed" for o in outcomes)
+        self.table.round_trip(2 if failures else 1)
+        if before_commit:
+            before_commit(_FakeCursor(self.table))
+        written = 0
+        with self.table._lock:
+            for outcome in outcomes:
+                doc = self.table._docs.get(outcome["id"])
+                if doc and doc.lease_owner == self.owner:
+                    doc.status, doc.lease_owner = outcome["status"], None
+                    written += 1
+        self.table.round_trip()
+        self._release_held(o["id"] for o in outcomes)
+        return written
+
+    def release(self, doc_ids: Iterable[int], failures: Optional[List[Dict[str, Any]]] = None):
+        ids = list(doc_ids)
+        if not ids:
+            return
+        self.table.round_trip(3 if failures else 2)
+        with self.table._lock:
+            for doc_id in ids:
+                doc = self.table._docs.get(doc_id)
+                if doc and doc.lease_owner == self.owner and doc.status == "processing":
+                    doc.status, doc.lease_owner = "pending", None
+        self._release_held(ids)
+
+    def heartbeat(self):
+        if self.held():
+            self.table.round_trip(2)
+
+
+class BenchChunkRefs(ChunkRefs):
+    """
+    ChunkRefs kept in memory, so CHUNK_DEDUP ingestion runs without Postgres.
+    Round trips mirror the real statements: replace = lock + DELETE + INSERT
+    (+ SELECT of released chunks) + COMMIT; references / prune one SELECT each.
+    """
+
+    def __init__(self, table: FakeDocumentTable):
+        super().__init__(get_conn=lambda: None, put_conn=lambda conn: None)
+        self.table = table
+        self._refs: Dict[str, Dict[str, Set[str]]] = {}  # collection -> chunk id -> documents
+        self._lock = threading.RLock()
+
+    def replace(self, collection: str, document_id: str, chunk_ids: Sequence[str],
+                drop_chunks: Callable[[List[str]], None]) -> Tuple[List[str], Set[str]]:
+        document_id = str(document_id)
+        wanted = set(chunk_ids)
+        with self._lock:
+            refs = self._refs.setdefault(collection, {})
+            released = [c for c, docs in refs.items() if document_id in docs and c not in wanted]
+            for chunk_id in released:
+                refs[chunk_id].discard(document_id)
+            for chunk_id in wanted:
+                refs.setdefault(chunk_id, set()).add(document_id)
+            shared = {c for c in released if refs[c]}
+            orphans = [c for c in released if not refs[c]]
+            for chunk_id in orphans:
+                del refs[chunk_id]
+            self.table.round_trip(5 if released else 4)
+            if orphans:
+                drop_chunks(orphans)
+        return orphans, shared
+
+    def references(self, collection: str, chunk_ids: Sequence[str]) -> Dict[str, Set[str]]:
+        if not chunk_ids:
+            return {}
+        self.table.round_trip(2)
+        with self._lock:
+            refs = self._refs.get(collection, {})
+            return {c: set(refs[c]) for c in chunk_ids if refs.get(c)}
+
+    def prune(self, collection: str, chunk_ids: Sequence[str], drop_chunks: Callable[[List[str]], None]) -> List[str]:
+        if not chunk_ids:
+            return []
+        self.table.round_trip(3)
+        with self._lock:
+            refs = self._refs.get(collection, {})
+            orphans = [c for c in dict.fromkeys(chunk_ids) if not refs.get(c)]
+            if orphans:
+                drop_chunks(orphans)
+        return orphans
+
+    def drop(self, collection: str):
+        self.table.round_trip(2)
+        with self._lock:
+            self._refs.pop(collection, None)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for name, refs in sorted(self._refs.items()):
+                references = sum(len(docs) for docs in refs.values())
+                documents = len(set().union(*refs.values())) if refs else 0
+                result[name] = {"chunks": len(refs), "references": references, "documents": documents,
+                                "deduplicated": references - len(refs)}
+            return result
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size from /proc (Linux); None elsewhere."""
+    try:
+        with open(f"/proc/{os.getpid()}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
@@ -0,0 +1,236 @@
+"""
+HNSW parameter sweep against an org's real chunk embeddings.
+
+Samples embeddings from a collection, holds some out as queries, computes the
+exact cosine top-k with NumPy as ground truth, then builds one HNSW index per
+(M, construction_ef) candidate and queries it at each search_ef. Reports
+recall@k, single-query p50/p99 latency, build time and index memory per
+configuration, and recommends the fastest one meeting --target-recall.
+
+Indexes are built with hnswlib (installed with chromadb as chroma-hnswlib), the
+same library Chroma uses, so the numbers carry over. hnsw:batch_size and
+hnsw:sync_threshold only affect how Chroma persists inserts, not the graph,
+and are not swept.
+
+Run from backend/worker:
+    python benchmarks/hnsw_sweep.py --org-id 7 --host localhost --output sweep.json
+    python benchmarks/hnsw_sweep.py --org-id 7 --host localhost --write-overrides
+The second form merges the recommendation into HNSW_OVERRIDES_PATH, which
+get_org_collection applies when the collection is next created.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+WORKER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if WORKER_DIR not in sys.path:
+    sys.path.insert(0, WORKER_DIR)
+
+from benchmarks.fakes import current_rss_bytes
+from vectorstore.chroma_store import BACKENDS, create_vector_store
+from vectorstore.hnsw_overrides import write_override
+
+logger = logging.getLogger("hnsw_sweep")
+
+DEFAULT_OVERRIDES_PATH = os.getenv("HNSW_OVERRIDES_PATH", os.path.join(WORKER_DIR, "hnsw_overrides.json"))
+
+
+def _int_list(raw: str) -> List[int]:
+    return [int(v) for v in raw.split(",") if v.strip()]
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument("--org-id", type=int, help="sweep privacy_documents_<org-id>")
+    target.add_argument("--collection", help="sweep this collection")
+    target.add_argument("--from-npy", help="read embeddings from a .npy file instead of the vector store")
+    p.add_argument("--backend", default=os.getenv("VECTOR_STORE_BACKEND", "http"), choices=BACKENDS)
+    p.add_argument("--host", default=os.getenv("CHROMADB_HOST", "chromadb"))
+    p.add_argument("--port", type=int, default=int(os.getenv("CHROMADB_PORT", 8000)))
+    p.add_argument("--path", default=os.getenv("VECTOR_STORE_PATH", "/data/chroma"), help="embedded store directory")
+    p.add_argument("--sample", type=int, default=20000, help="embeddings to sample (corpus + queries)")
+    p.add_argument("--queries", type=int, default=200, help="sampled embeddings held out as queries")
+    p.add_argument("--k", type=int, default=10, help="recall@k / top_k of the search path")
+    p.add_argument("--M", type=_int_list, default=[16, 32, 48])
+    p.add_argument("--construction-ef", type=_int_list, default=[100, 200, 400])
+    p.add_argument("--search-ef", type=_int_list, default=[32, 64, 100, 200])
+    p.add_argument("--target-recall", type=float, default=0.95)
+    p.add_argument("--build-threads", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--page-size", type=int, default=2000)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--output", help="also write the JSON report here")
+    p.add_argument("--write-overrides", nargs="?", const=DEFAULT_OVERRIDES_PATH, default=None,
+                   help=f"merge the recommendation into an overrides file (default {DEFAULT_OVERRIDES_PATH})")
+    p.add_argument("--log-level", default="INFO")
+    return p.parse_args(argv)
+
+
+def sample_embeddings(collection, sample: int, page_size: int, rng: np.random.Generator) -> np.ndarray:
+    """Up to `sample` embeddings: the whole collection when it is small enough,
+    otherwise pages read at random offsets (block sampling keeps it to a few
+    round trips)."""
+    total = collection.count()
+    if total == 0:
+        raise SystemExit(f"Collection {collection.name} is empty")
+    if total <= sample:
+        offsets = list(range(0, total, page_size))
+    else:
+        starts = np.arange(0, total, page_size)
+        wanted = int(np.ceil(sample / page_size))
+        offsets = sorted(rng.choice(starts, size=min(wanted, len(starts)), replace=False).tolist())
+    rows = []
+    for offset in offsets:
+        page = collection.get(include=["embeddings"], limit=page_size, offset=int(offset))
+        embeddings = page.get("embeddings")
+        if embeddings is not None and len(embeddings):
+            rows.append(np.asarray(embeddings, dtype=np.float32))
+    vectors = np.vstack(rows)
+    logger.info("Sampled %d of %d embeddings from %s (dim %d)", min(len(vectors), sample), total,
+                collection.name, vectors.shape[1])
+    return vectors[:sample]
+
+
+def normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int, block: int = 256) -> np.ndarray:
+    """Ground-truth ids of the k most cosine-similar corpus rows per query (inputs normalised)."""
+    truth = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), block):
+        similarities = queries[start:start + block] @ corpus.T
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(similarities, top, axis=1), axis=1)
+        truth[start:start + block] = np.take_along_axis(top, order, axis=1)
+    return truth
+
+
+def estimated_index_bytes(n: int, dim: int, m: int) -> int:
+    """hnswlib layout: level 0 stores the vector, 2*M links and a label per
+    element; upper levels (~1/M of elements per level) store M links each."""
+    level0 = n * (dim * 4 + 2 * m * 4 + 4 + 8)
+    upper = int(n / max(m - 1, 1) * (m * 4 + 4))
+    return level0 + upper
+
+
+def sweep(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, args) -> List[Dict[str, Any]]:
+    try:
+        import hnswlib
+    except ImportError:
+        raise SystemExit("hnswlib is not installed (pip install chroma-hnswlib, which chromadb depends on)")
+
+    n, dim = corpus.shape
+    k = truth.shape[1]
+    labels = np.arange(n)
+    rows = []
+    for m in args.M:
+        for construction_ef in args.construction_ef:
+            rss_before = current_rss_bytes()
+            index = hnswlib.Index(space="cosine", dim=dim)
+            index.init_index(max_elements=n, ef_construction=construction_ef, M=m, random_seed=args.seed)
+            started = time.perf_counter()
+            index.add_items(corpus, labels, num_threads=args.build_threads)
+            build_seconds = time.perf_counter() - started
+            rss_after = current_rss_bytes()
+            index.set_num_threads(1)  # the search path issues one query per request
+
+            for search_ef in args.search_ef:
+                index.set_ef(max(search_ef, k))
+                latencies = []
+                found = np.empty_like(truth)
+                for i, query in enumerate(queries):
+                    t0 = time.perf_counter()
+                    result, _ = index.knn_query(query, k=k)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    found[i] = result[0]
+                recall = float(np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(truth))]))
+                rows.append({
+                    "hnsw:M": m,
+                    "hnsw:construction_ef": construction_ef,
+                    "hnsw:search_ef": search_ef,
+                    f"recall@{k}": round(recall, 4),
+                    "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                    "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+                    "build_seconds": round(build_seconds, 2),
+                    "index_mb_estimate": round(estimated_index_bytes(n, dim, m) / 2 ** 20, 1),
+                    "rss_delta_mb": round((rss_after - rss_before) / 2 ** 20, 1)
+                    if rss_before is not None and rss_after is not None else None,
+                })
+                logger.info("M=%d construction_ef=%d search_ef=%d recall@%d=%.4f p99=%.3fms build=%.1fs",
+                            m, construction_ef, search_ef, k, recall, rows[-1]["p99_ms"], build_seconds)
+            del index
+    return rows
+
+
+def recommend(rows: List[Dict[str, Any]], k: int, target_recall: float) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """Fastest (p99, then build time) configuration meeting the target; else the most accurate one."""
+    key = f"recall@{k}"
+    meeting = [r for r in rows if r[key] >= target_recall]
+    if meeting:
+        return min(meeting, key=lambda r: (r["p99_ms"], r["build_seconds"], r["index_mb_estimate"])), True
+    return (max(rows, key=lambda r: (r[key], -r["p99_ms"])) if rows else None), False
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level))
+    rng = np.random.default_rng(args.seed)
+
+    if args.from_npy:
+        name = os.path.splitext(os.path.basename(args.from_npy))[0]
+        vectors = np.load(args.from_npy).astype(np.float32)
+        if len(vectors) > args.sample:
+            vectors = vectors[rng.choice(len(vectors), size=args.sample, replace=False)]
+    else:
+        name = args.collection or f"privacy_documents_{args.org_id}"
+        store = create_vector_store(args.backend, host=args.host, port=args.port, path=args.path)
+        vectors = sample_embeddings(store.get_collection(name), args.sample, args.page_size, rng)
+
+    if len(vectors) <= args.queries + args.k:
+        raise SystemExit(f"Only {len(vectors)} embeddings sampled; need more than --queries + --k")
+    vectors = normalise(vectors[rng.permutation(len(vectors))])
+    queries, corpus = vectors[:args.queries], vectors[args.queries:]
+
+    started = time.perf_counter()
+    truth = exact_top_k(corpus, queries, args.k)
+    logger.info("Exact top-%d for %d queries over %d vectors in %.2fs", args.k, len(queries), len(corpus),
+                time.perf_counter() - started)
+
+    rows = sweep(corpus, queries, truth, args)
+    best, meets_target = recommend(rows, args.k, args.target_recall)
+    report = {
+        "collection": name,
+        "corpus_size": len(corpus),
+        "queries": len(queries),
+        "dim": corpus.shape[1],
+        "k": args.k,
+        "target_recall": args.target_recall,
+        "results": sorted(rows, key=lambda r: (r["hnsw:M"], r["hnsw:construction_ef"], r["hnsw:search_ef"])),
+        "recommended": best,
+        "recommended_meets_target": meets_target,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.write_overrides and best:
+        if not meets_target:
+            logger.warning("No configuration reached recall %.2f; writing the most accurate one", args.target_recall)
+        write_override(args.write_overrides, name, best)
+        logger.info("Wrote HNSW override for %s to %s", name, args.write_overrides)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
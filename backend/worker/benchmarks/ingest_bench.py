@@ -0,0 +1,401 @@
+"""
+Offline ingestion throughput benchmark.
+
+Runs the worker's real ingestion code (run_batch_processing for scheduler
+slices, process_document_job for Redis jobs) against in-process stand-ins for
+Ollama, Chroma, MinIO and Postgres with configurable latency, over a
+deterministic synthetic corpus. Prints a JSON report with docs/s, chunks/s,
+per-stage time and peak RSS; pass a previous report with --compare to see the
+change between two commits.
+
+Run from backend/worker (needs the worker's requirements, not the services):
+    python benchmarks/ingest_bench.py --corpus mixed --docs 300 --output before.json
+    git checkout my-branch
+    python benchmarks/ingest_bench.py --corpus mixed --docs 300 --compare before.json
+
+Latency knobs are in milliseconds; the defaults approximate the docker stack
+on one machine (CPU Ollama, local Chroma/MinIO/Postgres).
+"""
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import logging
+import statistics
+import subprocess
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+WORKER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if WORKER_DIR not in sys.path:
+    sys.path.insert(0, WORKER_DIR)
+
+from benchmarks.corpus import CORPUS_KINDS, build_corpus
+from benchmarks.fakes import (Latency, FakeOllamaServer, FakeChromaClient, FakeMinio, FakeDocumentTable,
+                              BenchLeaseManager, BenchChunkRefs, fake_job_connection, current_rss_bytes)
+
+logger = logging.getLogger("ingest_bench")
+
+BENCH_ORG_ID = 1
+
+# Worker functions timed as pipeline stages (wrapped on the imported module, so
+# both ingestion paths are measured the same way). Nested calls are attributed
+# to every stage they run under; `wall_share` is relative to the run's wall time.
+TIMED_STAGES = {
+    "extract_text_from_file": "parse",
+    "chunk_text": "chunk",
+    "get_embeddings": "embed",
+    "chromadb_add": "store",
+}
+
+# Metrics shown by --compare: (path, higher_is_better)
+COMPARE_METRICS = [
+    ("docs_per_sec", True),
+    ("chunks_per_sec", True),
+    ("wall_seconds", False),
+    ("peak_rss_mb", False),
+    ("db.statements", False),
+    ("embedding.requests", False),
+]
+
+
+class StageTimer:
+    """Thread-safe wall time accumulated per stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals: Dict[str, List[float]] = {}
+
+    def add(self, stage: str, seconds: float, count: int = 1):
+        with self._lock:
+            totals = self.totals.setdefault(stage, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += count
+
+    def wrap(self, stage: str, fn: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - started)
+        timed.__wrapped__ = fn
+        return timed
+
+    def report(self, wall: float) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {
+                    "total_ms": round(total * 1000.0, 1),
+                    "count": count,
+                    "avg_ms": round(total * 1000.0 / count, 2) if count else 0.0,
+                    "wall_share": round(total / wall, 3) if wall else 0.0,
+                }
+                for stage, (total, count) in sorted(self.totals.items())
+            }
+
+
+class RSSSampler:
+    """Samples resident memory every `interval` seconds while running."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.start_bytes = current_rss_bytes() or 0
+        self.peak_bytes = self.start_bytes
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        self._thread.join()
+        self._sample()
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss:
+            self.peak_bytes = max(self.peak_bytes, rss)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+
+def _mb(value: float) -> float:
+    return round(value / (1024 * 1024), 1)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=WORKER_DIR,
+                             capture_output=True, text=True, timeout=5)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=WORKER_DIR,
+                               capture_output=True, text=True, timeout=5)
+        rev = out.stdout.strip()
+        return f"{rev}-dirty" if rev and dirty.stdout.strip() else rev or None
+    except Exception:
+        return None
+
+
+def load_worker(args, ollama: FakeOllamaServer, chroma: FakeChromaClient):
+    """Import app.py wired to the fakes. Environment and the chromadb client class
+    are patched before the import because app.py resolves both at import time."""
+    os.environ["OLLAMA_URL"] = ollama.url
+    os.environ["OLLAMA_EMBED_MODEL"] = ollama.model
+    os.environ["MODERATION_BACKEND"] = args.moderation
+    os.environ["AUTOINDEX_LISTEN"] = "false"
+    os.environ["INGESTION_FLUSH_SIZE"] = str(args.flush_size)
+    if args.embed_concurrency:
+        os.environ["EMBED_CONCURRENCY_INITIAL"] = str(args.embed_concurrency)
+    import chromadb
+    if args.chroma == "fake":
+        chromadb.HttpClient = lambda *a, **kw: chroma
+    else:
+        # Real in-process Chroma (HNSW insert cost included)
+        chromadb.HttpClient = lambda *a, **kw: chromadb.EphemeralClient()
+
+    started = time.perf_counter()
+    import app as worker
+    import_seconds = time.perf_counter() - started
+    logging.getLogger().setLevel(getattr(logging, args.log_level))
+    return worker, import_seconds
+
+
+def install_fakes(worker, table: FakeDocumentTable, minio: FakeMinio, timer: StageTimer):
+    from ingestion.jobs import IngestionJobManager, IngestionJobStore
+    from ingestion.leases import StatusBuffer
+
+    worker.document_leases = BenchLeaseManager(table)
+    worker.status_buffer = StatusBuffer(worker.document_leases, max_items=worker.INGESTION_FLUSH_SIZE)
+    worker.ingestion_jobs = IngestionJobManager(store=IngestionJobStore(fake_job_connection(table)))
+    worker.chunk_refs = BenchChunkRefs(table)
+    worker.minio_client = minio
+    worker.get_minio_client = lambda *a, **kw: minio
+    # Side indexes kept in Postgres / Redis are not part of what this benchmark
+    # measures (and those services are absent); the in-process BM25 index stays
+    worker.blind_index.index_chunks = lambda *a, **kw: 0
+    worker.result_cache.enabled = False
+    for name, stage in TIMED_STAGES.items():
+        fn = getattr(worker, name)
+        setattr(worker, name, timer.wrap(stage, getattr(fn, "__wrapped__", fn)))
+    moderate = worker.moderation_stage.moderate
+    worker.moderation_stage.moderate = timer.wrap("moderation", getattr(moderate, "__wrapped__", moderate))
+
+
+def run_batch_mode(worker, args, table: FakeDocumentTable) -> Dict[str, Any]:
+    """Scheduler path: repeated run_batch_processing slices until the org is drained."""
+    from ingestion.scheduler import LANE_BULK
+    job = worker.ingestion_jobs.submit(BENCH_ORG_ID, lane=LANE_BULK, source="benchmark")
+    worker.ingestion_jobs.slice_started(job)
+    slices = 0
+    while table.pending(BENCH_ORG_ID):
+        result = worker.run_batch_processing(BENCH_ORG_ID, batch_size=args.batch_size,
+                                             max_documents=args.slice_size, job=job)
+        slices += 1
+        if result.get("error") or result.get("deferred"):
+            logger.error("Slice stopped early: %s", result)
+            break
+    worker.ingestion_jobs.slice_finished(job, drained=not table.pending(BENCH_ORG_ID))
+    return {"slices": slices, "job_stage_latency_ms": job.stage_latency_ms()}
+
+
+def run_jobs_mode(worker, args, table: FakeDocumentTable) -> Dict[str, Any]:
+    """Redis path: `workers` threads calling process_document_job, statuses group-committed."""
+    jobs: "queue.Queue" = queue.Queue()
+    for doc in table.all():
+        jobs.put({"type": "file", "key": doc.file_key or f"records/{doc.id}", "filename": doc.filename,
+                  "org_id": doc.org_id, "document_id": doc.id})
+
+    def consume():
+        while True:
+            try:
+                job_data = jobs.get_nowait()
+            except queue.Empty:
+                return
+            worker.process_document_job(job_data)
+
+    worker.status_buffer.start()
+    threads = [threading.Thread(target=consume, name=f"bench-job-{i}") for i in range(args.workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    worker.status_buffer.flush()
+    return {"workers": args.workers}
+
+
+def run_once(worker, args, table: FakeDocumentTable, chroma: FakeChromaClient,
+             minio: FakeMinio, ollama: FakeOllamaServer) -> Dict[str, Any]:
+    table.reset()
+    if args.chroma == "fake":
+        chroma.reset_data()
+    else:
+        try:
+            worker.vector_store.delete_collection(f"privacy_documents_{BENCH_ORG_ID}")
+        except Exception:
+            pass
+    worker._embedding_cache.clear()
+    timer = StageTimer()
+    install_fakes(worker, table, minio, timer)
+    db_before = table.counter.snapshot()
+    ollama_before = ollama.counter.snapshot()
+    chroma_before = chroma.counter.snapshot()
+
+    with RSSSampler() as rss:
+        started = time.perf_counter()
+        details = (run_batch_mode if args.mode == "batch" else run_jobs_mode)(worker, args, table)
+        wall = time.perf_counter() - started
+
+    statuses = table.status_counts()
+    processed = statuses.get("processed", 0)
+    chunks = int(_delta(chroma.counter.snapshot(), chroma_before).get("vectors_added", 0))
+    if args.chroma != "fake":
+        chunks = worker.get_org_collection(org_id=BENCH_ORG_ID).count()
+    embedding = _delta(ollama.counter.snapshot(), ollama_before)
+    return {
+        "wall_seconds": round(wall, 3),
+        "docs": len(table.all()),
+        "processed": processed,
+        "statuses": statuses,
+        "chunks": chunks,
+        "docs_per_sec": round(processed / wall, 2) if wall else 0.0,
+        "chunks_per_sec": round(chunks / wall, 2) if wall else 0.0,
+        "stages": timer.report(wall),
+        "db": _delta(table.counter.snapshot(), db_before),
+        "embedding": {k: round(v, 3) for k, v in embedding.items()},
+        "embedding_client": worker.embedding_client.metrics(),
+        "rss_start_mb": _mb(rss.start_bytes),
+        "peak_rss_mb": _mb(rss.peak_bytes),
+        "peak_rss_delta_mb": _mb(rss.peak_bytes - rss.start_bytes),
+        **details,
+    }
+
+
+def _delta(after: Dict[str, float], before: Dict[str, float]) -> Dict[str, float]:
+    return {k: v - before.get(k, 0) for k, v in after.items()}
+
+
+def _lookup(report: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = report
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-metric change vs a previous report; `improved` accounts for direction."""
+    out = {"baseline_revision": baseline.get("revision"), "metrics": {}}
+    for path, higher_is_better in COMPARE_METRICS:
+        old, new = _lookup(baseline, path), _lookup(current, path)
+        if old is None or new is None:
+            continue
+        change = round((new - old) / old * 100.0, 1) if old else None
+        out["metrics"][path] = {"baseline": old, "current": new, "change_pct": change,
+                                "improved": (new > old) == higher_is_better if new != old else None}
+    return out
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Median run by docs/s, plus the spread across runs."""
+    ordered = sorted(runs, key=lambda r: r["docs_per_sec"])
+    median = dict(ordered[len(ordered) // 2])
+    if len(runs) > 1:
+        rates = [r["docs_per_sec"] for r in runs]
+        median["runs"] = len(runs)
+        median["docs_per_sec_all"] = rates
+        median["docs_per_sec_stdev"] = round(statistics.stdev(rates), 2)
+    return median
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline ingestion throughput benchmark (no docker stack needed).")
+    parser.add_argument("--mode", choices=("batch", "jobs"), default="batch",
+                        help="batch = run_batch_processing slices (scheduler), jobs = process_document_job (Redis)")
+    parser.add_argument("--corpus", choices=CORPUS_KINDS + ("mixed",), default="mixed")
+    parser.add_argument("--docs", type=int, default=200, help="Documents in the corpus")
+    parser.add_argument("--csv-rows", type=int, default=20, help="Rows per CSV file")
+    parser.add_argument("--pdf-pages", type=int, default=3, help="Pages per PDF")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs to take the median of")
+    parser.add_argument("--batch-size", type=int, default=25, help="Documents claimed per batch (batch mode)")
+    parser.add_argument("--slice-size", type=int, default=100, help="max_documents per slice (batch mode)")
+    parser.add_argument("--workers", type=int, default=4, help="Job threads (jobs mode)")
+    parser.add_argument("--flush-size", type=int, default=50, help="INGESTION_FLUSH_SIZE")
+    parser.add_argument("--embed-concurrency", type=int, help="EMBED_CONCURRENCY_INITIAL")
+    parser.add_argument("--moderation", choices=("none", "local"), default="local")
+    parser.add_argument("--chroma", choices=("fake", "ephemeral"), default="fake",
+                        help="fake = in-memory stand-in with latency, ephemeral = real in-process Chroma")
+
+    latency = parser.add_argument_group("stand-in latency (ms)")
+    latency.add_argument("--embed-ms", type=float, default=15.0, help="Ollama time per embedding request")
+    latency.add_argument("--embed-ms-per-kchar", type=float, default=10.0, help="Extra Ollama time per 1000 chars")
+    latency.add_argument("--embed-parallel", type=int, default=4, help="Requests Ollama computes at once")
+    latency.add_argument("--embed-dim", type=int, default=768)
+    latency.add_argument("--embed-error-rate", type=float, default=0.0, help="Share of embedding requests answered 503")
+    latency.add_argument("--chroma-ms", type=float, default=3.0, help="Chroma time per call")
+    latency.add_argument("--chroma-ms-per-vector", type=float, default=0.2)
+    latency.add_argument("--minio-ms", type=float, default=2.0, help="MinIO time per request")
+    latency.add_argument("--minio-ms-per-kib", type=float, default=0.01)
+    latency.add_argument("--db-ms", type=float, default=0.5, help="Postgres round trip per statement")
+
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    parser.add_argument("--log-level", default="WARNING", choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level))
+
+    documents, objects = build_corpus(args.corpus, args.docs, org_id=BENCH_ORG_ID, seed=args.seed,
+                                      csv_rows=args.csv_rows, pdf_pages=args.pdf_pages)
+    ollama = FakeOllamaServer(Latency(args.embed_ms, args.embed_ms_per_kchar), dim=args.embed_dim,
+                              parallel=args.embed_parallel, error_rate=args.embed_error_rate).start()
+    chroma = FakeChromaClient(Latency(args.chroma_ms, args.chroma_ms_per_vector))
+    minio = FakeMinio(objects, Latency(args.minio_ms, args.minio_ms_per_kib))
+    table = FakeDocumentTable(documents, Latency(args.db_ms))
+
+    try:
+        worker, import_seconds = load_worker(args, ollama, chroma)
+        runs = [run_once(worker, args, table, chroma, minio, ollama) for _ in range(max(1, args.repeat))]
+    finally:
+        ollama.stop()
+
+    report = {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {
+            "mode": args.mode, "corpus": args.corpus, "docs": args.docs, "seed": args.seed,
+            "batch_size": args.batch_size, "slice_size": args.slice_size, "workers": args.workers,
+            "flush_size": args.flush_size, "moderation": args.moderation, "chroma": args.chroma,
+            "latency_ms": {
+                "embed": ollama.latency.to_dict(), "embed_parallel": args.embed_parallel,
+                "chroma": chroma.latency.to_dict(), "minio": minio.latency.to_dict(), "db": table.latency.to_dict(),
+            },
+        },
+        "import_seconds": round(import_seconds, 2),
+        **summarize(runs),
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(json.load(f), report)
+
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,477 @@
+import time
+import uuid
+import socket
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+from psycopg2.extras import Json as PGJson
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_CANCELLING = "cancelling"
+JOB_CANCELLED = "cancelled"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+ACTIVE_STATES = (JOB_QUEUED, JOB_RUNNING, JOB_CANCELLING)
+
+# Rolling window used for the docs-per-second rate and therefore the ETA
+RATE_WINDOW_SECONDS = 60.0
+
+JOB_OWNER = socket.gethostname()
+
+
+class IngestionJob:
+    """
+    One org-level indexing request. The scheduler executes it as a series of
+    slices on its dedicated executor; counters accumulate across slices and the
+    job finishes once the org is drained (or it is cancelled).
+
+    Progress is recorded by the slice threads for each flush group of document
+    outcomes and checkpointed to the ingestion_jobs table in the same
+    transaction that commits their statuses (and reverted if that commit
+    fails), so a restarted worker resumes with accurate counters.
+    """
+
+    def __init__(self, org_id: int, lane: str, source: str, job_id: Optional[str] = None):
+        self.id = job_id or str(uuid.uuid4())
+        self.org_id = org_id
+        self.lane = lane
+        self.source = source
+        self.owner = JOB_OWNER
+        self.status = JOB_QUEUED
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.processed = 0
+        self.failed = 0
+        self.chunks = 0
+        self.last_document_id: Optional[int] = None
+        self.slices = 0
+        self.running_slices = 0
+        self.drained = False
+        self.resumed = False
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self._stage_totals: Dict[str, List[float]] = {}
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "IngestionJob":
+        job = cls(row["org_id"], row.get("lane") or "bulk", row.get("source") or "scanner", job_id=row["id"])
+        job.created_at = row.get("created_at") or job.created_at
+        job.started_at = row.get("started_at")
+        job.processed = row.get("docs_processed") or 0
+        job.failed = row.get("docs_failed") or 0
+        job.chunks = row.get("chunks_indexed") or 0
+        job.last_document_id = row.get("last_document_id")
+        for stage, stats in (row.get("stage_latency_ms") or {}).items():
+            job._stage_totals[stage] = [stats.get("total_ms", 0) / 1000.0, stats.get("count", 0)]
+        job.resumed = True
+        return job
+
+    def record_stage(self, stage: str, seconds: float, count: int = 1):
+        with self._lock:
+            totals = self._stage_totals.setdefault(stage, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += count
+
+    def record_documents(self, outcomes: List[Tuple[int, bool, int]]) -> Optional[int]:
+        """Count (doc_id, success, chunks) outcomes about to be committed. Returns
+        the previous last_document_id for revert_documents."""
+        with self._lock:
+            previous = self.last_document_id
+            now = time.time()
+            for doc_id, success, chunks in outcomes:
+                if success:
+                    self.processed += 1
+                    self.chunks += chunks
+                else:
+                    self.failed += 1
+                self.last_document_id = doc_id
+                self._recent.append(now)
+            return previous
+
+    def revert_documents(self, outcomes: List[Tuple[int, bool, int]], previous_last_id: Optional[int]):
+        """Undo record_documents when the status commit failed; the documents are
+        reclaimed with their leases and counted again then."""
+        with self._lock:
+            for _, success, chunks in outcomes:
+                if success:
+                    self.processed -= 1
+                    self.chunks -= chunks
+                else:
+                    self.failed -= 1
+            if outcomes and self.last_document_id == outcomes[-1][0]:
+                self.last_document_id = previous_last_id
+
+    @property
+    def handled(self) -> int:
+        return self.processed + self.failed
+
+    def docs_per_sec(self) -> float:
+        """Documents handled per second over the last RATE_WINDOW_SECONDS."""
+        now = time.time()
+        with self._lock:
+            while self._recent and self._recent[0] < now - RATE_WINDOW_SECONDS:
+                self._recent.popleft()
+            recent = len(self._recent)
+        if not self.started_at:
+            return 0.0
+        elapsed = min(RATE_WINDOW_SECONDS, max(now - self.started_at.timestamp(), 1.0))
+        return recent / elapsed
+
+    def stage_latency_ms(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {
+                    "total_ms": round(total * 1000.0, 1),
+                    "count": count,
+                    "avg_ms": round(total * 1000.0 / count, 2) if count else 0.0,
+                }
+                for stage, (total, count) in self._stage_totals.items()
+            }
+
+    def eta_seconds(self, remaining: int) -> Optional[float]:
+        rate = self.docs_per_sec()
+        if remaining <= 0:
+            return 0.0
+        if rate <= 0:
+            return None
+        return round(remaining / rate, 1)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "org_id": self.org_id,
+            "lane": self.lane,
+            "source": self.source,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "processed": self.processed,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "last_document_id": self.last_document_id,
+            "docs_per_sec": round(self.docs_per_sec(), 3),
+            "stage_latency_ms": self.stage_latency_ms(),
+            "slices": self.slices,
+            "running_slices": self.running_slices,
+            "resumed": self.resumed,
+            "error": self.error,
+        }
+
+
+class IngestionJobStore:
+    """Postgres persistence for ingestion jobs (table ingestion_jobs)."""
+
+    UPSERT_SQL = """
+        INSERT INTO ingestion_jobs
+            (id, org_id, lane, source, owner, status, docs_processed, docs_failed, chunks_indexed,
+             last_document_id, stage_latency_ms, docs_per_sec, error, created_at, started_at,
+             finished_at, updated_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (id) DO UPDATE SET
+            owner = EXCLUDED.owner,
+            status = EXCLUDED.status,
+            docs_processed = EXCLUDED.docs_processed,
+            docs_failed = EXCLUDED.docs_failed,
+            chunks_indexed = EXCLUDED.chunks_indexed,
+            last_document_id = EXCLUDED.last_document_id,
+            stage_latency_ms = EXCLUDED.stage_latency_ms,
+            docs_per_sec = EXCLUDED.docs_per_sec,
+            error = EXCLUDED.error,
+            started_at = EXCLUDED.started_at,
+            finished_at = EXCLUDED.finished_at,
+            updated_at = NOW()
+    """
+
+    def __init__(self, connect: Callable[[], Any]):
+        self.connect = connect
+
+    def _params(self, job: IngestionJob):
+        return (job.id, job.org_id, job.lane, job.source, job.owner, job.status,
+                job.processed, job.failed, job.chunks, job.last_document_id,
+                PGJson(job.stage_latency_ms()), job.docs_per_sec(), job.error,
+                job.created_at, job.started_at, job.finished_at)
+
+    def save(self, job: IngestionJob, cursor=None):
+        """Persist a job. With `cursor`, the write joins the caller's transaction
+        (guarded by a savepoint so a checkpoint failure cannot abort it)."""
+        if cursor is not None:
+            cursor.execute("SAVEPOINT ingestion_job_checkpoint")
+            try:
+                cursor.execute(self.UPSERT_SQL, self._params(job))
+                cursor.execute("RELEASE SAVEPOINT ingestion_job_checkpoint")
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT ingestion_job_checkpoint")
+                logger.error("[Jobs] Checkpoint failed for job %s: %s", job.id, e)
+            return
+        conn = None
+        try:
+            conn = self.connect()
+            with conn.cursor() as cur:
+                cur.execute(self.UPSERT_SQL, self._params(job))
+            conn.commit()
+        except Exception as e:
+            logger.error("[Jobs] Failed to persist job %s: %s", job.id, e)
+        finally:
+            if conn:
+                conn.close()
+
+    def _fetch(self, sql: str, params) -> List[Dict[str, Any]]:
+        conn = None
+        try:
+            conn = self.connect()
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                cols = [c[0] for c in cur.description]
+                return [dict(zip(cols, row)) for row in cur.fetchall()]
+        except Exception as e:
+            logger.error("[Jobs] Failed to load jobs: %s", e)
+            return []
+        finally:
+            if conn:
+                conn.close()
+
+    def load_resumable(self, owner: str, stale_seconds: int) -> List[Dict[str, Any]]:
+        """Unfinished jobs left by a previous run of this host, or abandoned by any host."""
+        return self._fetch("""
+            SELECT * FROM ingestion_jobs
+            WHERE status IN %s
+              AND (owner = %s OR updated_at < NOW() - (%s * INTERVAL '1 second'))
+            ORDER BY created_at ASC
+        """, (ACTIVE_STATES, owner, stale_seconds))
+
+    def latest_for_org(self, org_id: int) -> Optional[Dict[str, Any]]:
+        rows = self._fetch(
+            "SELECT * FROM ingestion_jobs WHERE org_id = %s ORDER BY created_at DESC LIMIT 1",
+            (org_id,)
+        )
+        return rows[0] if rows else None
+
+    def pause_org(self, org_id: int, job_id: str):
+        conn = None
+        try:
+            conn = self.connect()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO ingestion_paused_orgs (org_id, job_id, paused_at) VALUES (%s, %s, NOW())
+                    ON CONFLICT (org_id) DO UPDATE SET job_id = EXCLUDED.job_id, paused_at = NOW()
+                """, (org_id, job_id))
+            conn.commit()
+        except Exception as e:
+            logger.error("[Jobs] Failed to persist pause of org_id=%s: %s", org_id, e)
+        finally:
+            if conn:
+                conn.close()
+
+    def resume_org(self, org_id: int):
+        conn = None
+        try:
+            conn = self.connect()
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM ingestion_paused_orgs WHERE org_id = %s", (org_id,))
+            conn.commit()
+        except Exception as e:
+            logger.error("[Jobs] Failed to resume org_id=%s: %s", org_id, e)
+        finally:
+            if conn:
+                conn.close()
+
+    def paused_orgs(self) -> Optional[Dict[int, Dict[str, Any]]]:
+        """Paused orgs by id, after resuming those with a document uploaded since
+        their pause. None if the table could not be read."""
+        conn = None
+        try:
+            conn = self.connect()
+            with conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM ingestion_paused_orgs p
+                    WHERE EXISTS (SELECT 1 FROM documents d WHERE d.org_id = p.org_id AND d.created_at > p.paused_at)
+                    RETURNING org_id
+                """)
+                resumed = [row[0] for row in cur.fetchall()]
+                cur.execute("SELECT org_id, job_id, paused_at FROM ingestion_paused_orgs")
+                rows = cur.fetchall()
+            conn.commit()
+        except Exception as e:
+            logger.error("[Jobs] Failed to load paused orgs: %s", e)
+            return None
+        finally:
+            if conn:
+                conn.close()
+        if resumed:
+            logger.info("[Jobs] Resumed org_id(s) %s: documents uploaded since their job was cancelled", resumed)
+        return {org_id: {"org_id": org_id, "job_id": job_id, "paused_at": paused_at.isoformat() if paused_at else None}
+                for org_id, job_id, paused_at in rows}
+
+
+class IngestionJobManager:
+    """Registry of indexing jobs (at most one active job per org), backed by an
+    optional IngestionJobStore so jobs survive worker restarts."""
+
+    def __init__(self, store: Optional[IngestionJobStore] = None, max_history: int = 200):
+        self.store = store
+        self.max_history = max_history
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, org_id: int, lane: str, source: str) -> IngestionJob:
+        """Return the org's active job, or create a new one."""
+        with self._lock:
+            job = self._active_for_org(org_id)
+            if job and job.status != JOB_CANCELLING:
+                return job
+            job = IngestionJob(org_id, lane, source)
+            self._jobs[job.id] = job
+            self._trim()
+        logger.info("[Jobs] Created job %s for org_id=%s (lane=%s source=%s)", job.id, org_id, lane, source)
+        self._persist(job)
+        return job
+
+    def recover(self, stale_seconds: int = 600) -> List[IngestionJob]:
+        """Reload unfinished jobs after a crash/restart. Cancelling jobs are closed;
+        the rest are re-queued with their checkpointed counters. Documents that were
+        mid-batch were never committed, so they are simply still 'pending'."""
+        if not self.store:
+            return []
+        resumed = []
+        for row in self.store.load_resumable(JOB_OWNER, stale_seconds):
+            job = IngestionJob.from_row(row)
+            if row["status"] == JOB_CANCELLING:
+                self._finish(job, JOB_CANCELLED)
+                self._persist(job)
+                continue
+            with self._lock:
+                if self._active_for_org(job.org_id):
+                    continue
+                self._jobs[job.id] = job
+            self._persist(job)
+            resumed.append(job)
+            logger.info("[Jobs] Resuming job %s for org_id=%s from checkpoint (processed=%d last_document_id=%s)",
+                        job.id, job.org_id, job.processed, job.last_document_id)
+        return resumed
+
+    def checkpoint(self, job: IngestionJob, cursor):
+        """Write job progress inside the caller's open transaction (before its commit)."""
+        if self.store:
+            self.store.save(job, cursor=cursor)
+
+    def latest_for_org(self, org_id: int) -> Optional[Dict[str, Any]]:
+        """Most recent job for an org, from memory or (after a restart) from the store."""
+        jobs = self.list(org_id)
+        if jobs:
+            return jobs[0].to_dict()
+        if self.store:
+            row = self.store.latest_for_org(org_id)
+            if row:
+                job = IngestionJob.from_row(row)
+                job.status = row["status"]
+                job.finished_at = row.get("finished_at")
+                return job.to_dict()
+        return None
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, org_id: Optional[int] = None) -> List[IngestionJob]:
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if org_id is None or j.org_id == org_id]
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+    def active_for_org(self, org_id: int) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._active_for_org(org_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or not job.active:
+                return job
+            job.cancel_event.set()
+            if job.running_slices == 0:
+                self._finish(job, JOB_CANCELLED)
+            else:
+                job.status = JOB_CANCELLING
+        logger.info("[Jobs] Cancel requested for job %s (org_id=%s)", job.id, job.org_id)
+        self._persist(job)
+        return job
+
+    def pause_org(self, job: IngestionJob):
+        """Keep the org of a cancelled job out of scheduling across restarts (see paused_orgs)."""
+        if self.store:
+            self.store.pause_org(job.org_id, job.id)
+
+    def resume_org(self, org_id: int):
+        if self.store:
+            self.store.resume_org(org_id)
+
+    def paused_orgs(self) -> Optional[Dict[int, Dict[str, Any]]]:
+        """Orgs paused by a cancelled job and not resumed since, either explicitly or
+        by a new upload. None when unknown (no store, or it could not be read)."""
+        return self.store.paused_orgs() if self.store else None
+
+    def slice_started(self, job: IngestionJob):
+        with self._lock:
+            job.running_slices += 1
+            job.slices += 1
+            started = job.status == JOB_QUEUED
+            if started:
+                job.status = JOB_RUNNING
+                job.started_at = job.started_at or datetime.now()
+        if started:
+            self._persist(job)
+
+    def slice_finished(self, job: IngestionJob, drained: bool, error: Optional[str] = None):
+        """Close a slice. Document counters are recorded per status flush via record_documents."""
+        with self._lock:
+            job.running_slices -= 1
+            job.drained = job.drained or drained
+            if error:
+                job.error = error
+            if job.running_slices > 0:
+                return
+            if job.cancel_event.is_set():
+                self._finish(job, JOB_CANCELLED)
+            elif error:
+                self._finish(job, JOB_FAILED)
+            elif job.drained:
+                self._finish(job, JOB_COMPLETED)
+            else:
+                return
+        self._persist(job)
+
+    def _active_for_org(self, org_id: int) -> Optional[IngestionJob]:
+        for job in self._jobs.values():
+            if job.org_id == org_id and job.active:
+                return job
+        return None
+
+    def _finish(self, job: IngestionJob, status: str):
+        job.status = status
+        job.finished_at = datetime.now()
+        logger.info("[Jobs] Job %s for org_id=%s %s (processed=%d failed=%d chunks=%d)",
+                    job.id, job.org_id, status, job.processed, job.failed, job.chunks)
+
+    def _persist(self, job: IngestionJob):
+        if self.store:
+            self.store.save(job)
+
+    def _trim(self):
+        finished = [j for j in self._jobs.values() if not j.active]
+        overflow = len(self._jobs) - self.max_history
+        for job in sorted(finished, key=lambda j: j.created_at)[:max(0, overflow)]:
+            del self._jobs[job.id]
@@ -0,0 +1,316 @@
+import os
+import time
+import socket
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Any
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+# Columns returned for every claimed document (shape expected by batch processing)
+CLAIM_COLUMNS = ("id", "filename", "metadata", "file_key", "is_encrypted",
+                 "encrypted_dek", "encryption_iv", "encryption_tag", "uploaded_by")
+
+# No worker holds the row: its lease has expired (the worker died or stalled)
+# or was never set (pre-lease rows).
+LEASE_FREE_SQL = "(lease_expires_at IS NULL OR lease_expires_at < NOW())"
+# A document is claimable when it is pending, or 'processing' without a live lease.
+CLAIMABLE_SQL = f"""(status = 'pending'
+        OR (status = 'processing' AND {LEASE_FREE_SQL}))"""
+
+
+def default_lease_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseManager:
+    """
+    Lease-based claiming of documents for indexing.
+
+    A claim is one short transaction that flips a batch of claimable rows to
+    'processing' and stamps them with this worker's owner id and a lease expiry;
+    row locks are released immediately, so the slow work (download, embed, store)
+    happens outside any transaction. A heartbeat thread keeps the leases of held
+    documents alive; a lease that stops being renewed expires and the rows become
+    claimable by any other worker or node. Final status writes are fenced on
+    lease_owner, so a worker that lost its lease cannot overwrite the new owner.
+    """
+
+    def __init__(self,
+                 get_conn: Callable[[], Any],
+                 put_conn: Callable[[Any], None],
+                 owner: Optional[str] = None,
+                 lease_seconds: int = 300,
+                 heartbeat_interval: float = 30.0):
+        self.get_conn = get_conn
+        self.put_conn = put_conn
+        self.owner = owner or default_lease_owner()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self._held: set = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Claiming
+    # ------------------------------------------------------------------
+    def claim(self, org_id: int, limit: int, newest_first: bool = False) -> List[tuple]:
+        """Lease up to `limit` claimable documents of an org. Returns CLAIM_COLUMNS tuples."""
+        order = "DESC" if newest_first else "ASC"
+        rows = self._execute(f"""
+            UPDATE documents d
+            SET status = 'processing',
+                lease_owner = %s,
+                lease_expires_at = NOW() + (%s * INTERVAL '1 second'),
+                heartbeat_at = NOW()
+            WHERE d.id IN (
+                SELECT id FROM documents
+                WHERE org_id = %s AND {CLAIMABLE_SQL}
+                ORDER BY created_at {order}
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {", ".join("d." + c for c in CLAIM_COLUMNS)}
+        """, (self.owner, self.lease_seconds, org_id, limit), fetch=True)
+        self._hold(row[0] for row in rows)
+        return rows
+
+    def claim_document(self, doc_id: Optional[int] = None, file_key: Optional[str] = None) -> Optional[tuple]:
+        """Lease a single document by id or file_key (Redis job path). None if it is
+        not claimable, i.e. already processed or leased by a live worker. When a
+        re-upload left several claimable rows with one file_key, the newest is taken."""
+        column, value = ("id", doc_id) if doc_id else ("file_key", file_key)
+        rows = self._execute(f"""
+            UPDATE documents d
+            SET status = 'processing',
+                lease_owner = %s,
+                lease_expires_at = NOW() + (%s * INTERVAL '1 second'),
+                heartbeat_at = NOW()
+            WHERE d.id = (
+                SELECT id FROM documents
+                WHERE {column} = %s AND {CLAIMABLE_SQL}
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {", ".join("d." + c for c in CLAIM_COLUMNS)}
+        """, (self.owner, self.lease_seconds, value), fetch=True)
+        if not rows:
+            return None
+        self._hold([rows[0][0]])
+        return rows[0]
+
+    # ------------------------------------------------------------------
+    # Completion
+    # ------------------------------------------------------------------
+    def complete(self, outcomes: List[Dict[str, Any]], before_commit: Optional[Callable[[Any], None]] = None) -> int:
+        """
+        Write final statuses for leased documents and drop their leases, in one
+        transaction with a constant number of statements: one set-based
+        UPDATE ... FROM (VALUES ...) for all statuses and one INSERT for failure
+        records, whatever the batch size.
+
+        Each outcome is {"id", "status", "preview"?, "is_toxic"?, "toxicity_score"?}
+        plus, for failures, "org_id"?, "stage"? and "error"?.
+        `before_commit(cursor)` runs inside the same transaction (job checkpoints).
+        Returns the number of rows written; rows whose lease was lost are skipped.
+        """
+        if not outcomes:
+            return 0
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                rows = execute_values(cur, """
+                    UPDATE documents d
+                    SET status = v.status,
+                        processed_at = CASE WHEN v.status = 'processed' THEN NOW() ELSE d.processed_at END,
+                        content_preview = COALESCE(v.preview, d.content_preview),
+                        is_toxic = COALESCE(v.is_toxic, d.is_toxic),
+                        toxicity_score = COALESCE(v.toxicity_score, d.toxicity_score),
+                        lease_owner = NULL, lease_expires_at = NULL, heartbeat_at = NULL
+                    FROM (VALUES %s) AS v(id, status, preview, is_toxic, toxicity_score, owner)
+                    WHERE d.id = v.id AND d.lease_owner = v.owner
+                    RETURNING d.id
+                """, [(o["id"], o["status"], o.get("preview"), o.get("is_toxic"), o.get("toxicity_score"), self.owner)
+                      for o in outcomes],
+                    template="(%s::integer, %s::text, %s::text, %s::boolean, %s::double precision, %s::text)",
+                    page_size=len(outcomes), fetch=True)
+                written_ids = {row[0] for row in rows}
+                # Failure records only for rows we still owned
+                self._record_failures(cur, [o for o in outcomes
+                                            if o["status"] != "processed" and o["id"] in written_ids])
+                if before_commit:
+                    before_commit(cur)
+            conn.commit()
+            written = len(written_ids)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
+            self._release_held(o["id"] for o in outcomes)
+        if written < len(outcomes):
+            logger.warning("[Leases] %d of %d status writes skipped: lease lost to another worker",
+                           len(outcomes) - written, len(outcomes))
+        return written
+
+    def release(self, doc_ids: Iterable[int], failures: Optional[List[Dict[str, Any]]] = None):
+        """Give leased documents back as 'pending' (cancellation / aborted batch /
+        transient error). `failures` (outcome-shaped dicts) are recorded in the
+        same transaction so retried documents keep their error history."""
+        ids = list(doc_ids)
+        if not ids:
+            return
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE documents
+                    SET status = 'pending', lease_owner = NULL, lease_expires_at = NULL, heartbeat_at = NULL
+                    WHERE id = ANY(%s) AND lease_owner = %s AND status = 'processing'
+                """, (ids, self.owner))
+                self._record_failures(cur, failures or [])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
+            self._release_held(ids)
+
+    def _record_failures(self, cur, failures: List[Dict[str, Any]]):
+        if not failures:
+            return
+        execute_values(cur, """
+            INSERT INTO document_failures (document_id, org_id, status, stage, error, worker)
+            VALUES %s
+        """, [(f["id"], f.get("org_id"), f.get("status", "failed"), f.get("stage"),
+               (f.get("error") or "")[:2000] or None, self.owner) for f in failures],
+            page_size=len(failures))
+
+    # ------------------------------------------------------------------
+    # Heartbeat
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._heartbeat_loop, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info("[Leases] Heartbeat started (owner=%s lease=%ss interval=%ss)",
+                    self.owner, self.lease_seconds, self.heartbeat_interval)
+
+    def stop(self):
+        self._stopped.set()
+
+    def held(self) -> int:
+        with self._lock:
+            return len(self._held)
+
+    def heartbeat(self):
+        """Extend the leases of all held documents; forget the ones we no longer own."""
+        with self._lock:
+            ids = list(self._held)
+        if not ids:
+            return
+        rows = self._execute("""
+            UPDATE documents
+            SET lease_expires_at = NOW() + (%s * INTERVAL '1 second'), heartbeat_at = NOW()
+            WHERE id = ANY(%s) AND lease_owner = %s
+            RETURNING id
+        """, (self.lease_seconds, ids, self.owner), fetch=True)
+        lost = set(ids) - {row[0] for row in rows}
+        if lost:
+            logger.warning("[Leases] Lost lease on %d documents: %s", len(lost), sorted(lost)[:20])
+            self._release_held(lost)
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error("[Leases] Heartbeat failed: %s", e)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _hold(self, ids: Iterable[int]):
+        with self._lock:
+            self._held.update(ids)
+
+    def _release_held(self, ids: Iterable[int]):
+        with self._lock:
+            self._held.difference_update(ids)
+
+    def _execute(self, sql: str, params, fetch: bool = False) -> List[tuple]:
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall() if fetch else []
+            conn.commit()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
+
+
+class StatusBuffer:
+    """
+    Group commit for workers that finish one document at a time (Redis jobs).
+
+    Outcomes from all worker threads are buffered and written through
+    LeaseManager.complete in one transaction when `max_items` accumulate or the
+    oldest has waited `max_delay` seconds, so the number of round trips no longer
+    grows with the number of documents.
+    """
+
+    def __init__(self, leases: LeaseManager, max_items: int = 50, max_delay: float = 0.5):
+        self.leases = leases
+        self.max_items = max(1, max_items)
+        self.max_delay = max_delay
+        self._items: List[Dict[str, Any]] = []
+        self._first_at = 0.0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, name="status-buffer", daemon=True)
+        self._thread.start()
+
+    def add(self, outcome: Dict[str, Any]):
+        with self._cond:
+            if not self._items:
+                # Wake the flusher so it starts the max_delay countdown
+                self._first_at = time.monotonic()
+                self._cond.notify_all()
+            self._items.append(outcome)
+            if len(self._items) >= self.max_items:
+                self._cond.notify_all()
+
+    def flush(self):
+        with self._cond:
+            items, self._items = self._items, []
+        if not items:
+            return
+        try:
+            self.leases.complete(items)
+        except Exception as e:
+            # Leases stay set; the documents are reclaimed when they expire
+            logger.error("[Leases] Buffered status flush of %d documents failed: %s", len(items), e)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._items:
+                    self._cond.wait()
+                deadline = self._first_at + self.max_delay
+                while len(self._items) < self.max_items and time.monotonic() < deadline:
+                    self._cond.wait(timeout=max(0.0, deadline - time.monotonic()))
+            self.flush()
@@ -0,0 +1,201 @@
+import re
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class ModerationResult:
+    def __init__(self, flagged: bool, score: float = 0.0, categories: Optional[List[str]] = None):
+        self.flagged = flagged
+        self.score = score
+        self.categories = categories or []
+
+    def to_dict(self) -> Dict:
+        return {"flagged": self.flagged, "score": self.score, "categories": self.categories}
+
+
+class ModerationBackend:
+    """Classifies a batch of texts; must return one result per input, in order."""
+
+    name = "base"
+    max_batch = 32
+
+    def classify(self, texts: Sequence[str]) -> List[ModerationResult]:
+        raise NotImplementedError
+
+
+class OpenAIModerationBackend(ModerationBackend):
+    """OpenAI moderation endpoint with array input and one long-lived client."""
+
+    name = "openai"
+
+    def __init__(self, api_key: str, model: Optional[str] = None, max_batch: int = 32):
+        import openai
+        self.client = openai.OpenAI(api_key=api_key)
+        self.model = model
+        self.max_batch = max_batch
+
+    def classify(self, texts: Sequence[str]) -> List[ModerationResult]:
+        kwargs = {"input": list(texts)}
+        if self.model:
+            kwargs["model"] = self.model
+        response = self.client.moderations.create(**kwargs)
+        results = []
+        for result in response.results:
+            scores = {}
+            if getattr(result, "category_scores", None) is not None:
+                scores = result.category_scores.model_dump()
+            score = float(max((v for v in scores.values() if v is not None), default=0.0))
+            categories = [k for k, v in (result.categories.model_dump() if getattr(result, "categories", None) else {}).items() if v]
+            results.append(ModerationResult(bool(result.flagged), score, categories))
+        return results
+
+
+class KeywordModerationBackend(ModerationBackend):
+    """
+    Local lexicon-based moderation for offline runs and tests. A text is flagged
+    when blocked terms make up at least `threshold` of its words. Not a substitute
+    for a real classifier.
+    """
+
+    name = "local"
+    max_batch = 256
+
+    # Override with MODERATION_LOCAL_TERMS (comma separated)
+    DEFAULT_TERMS = ("kill yourself", "kys", "fuck", "shit", "bitch")
+
+    def __init__(self, terms: Optional[Sequence[str]] = None, threshold: float = 0.01):
+        self.terms = [t.strip().lower() for t in (terms or self.DEFAULT_TERMS) if t.strip()]
+        self.threshold = threshold
+        self._pattern = re.compile(r"\b(" + "|".join(re.escape(t) for t in self.terms) + r")\b", re.IGNORECASE) if self.terms else None
+
+    def classify(self, texts: Sequence[str]) -> List[ModerationResult]:
+        results = []
+        for text in texts:
+            if not self._pattern or not text:
+                results.append(ModerationResult(False, 0.0))
+                continue
+            hits = self._pattern.findall(text)
+            words = max(len(text.split()), 1)
+            score = min(1.0, len(hits) / words * 10)
+            flagged = bool(hits) and len(hits) / words >= self.threshold
+            results.append(ModerationResult(flagged, score, sorted({h.lower() for h in hits})))
+        return results
+
+
+class NullModerationBackend(ModerationBackend):
+    name = "none"
+    max_batch = 10000
+
+    def classify(self, texts: Sequence[str]) -> List[ModerationResult]:
+        return [ModerationResult(False, 0.0) for _ in texts]
+
+
+def build_moderation_backend(name: str, openai_api_key: Optional[str] = None,
+                             local_terms: Optional[str] = None) -> ModerationBackend:
+    """Resolve MODERATION_BACKEND ('auto', 'openai', 'local', 'none')."""
+    name = (name or "auto").lower()
+    if name == "auto":
+        name = "openai" if openai_api_key else "none"
+    if name == "openai":
+        if not openai_api_key:
+            logger.warning("[Moderation] MODERATION_BACKEND=openai but OPENAI_API_KEY is unset; moderation disabled")
+            return NullModerationBackend()
+        try:
+            return OpenAIModerationBackend(openai_api_key)
+        except Exception as e:
+            logger.error("[Moderation] OpenAI client unavailable (%s); moderation disabled", e)
+            return NullModerationBackend()
+    if name == "local":
+        terms = [t for t in local_terms.split(",")] if local_terms else None
+        return KeywordModerationBackend(terms)
+    return NullModerationBackend()
+
+
+class ModerationStage:
+    """
+    Batched, cached moderation that runs beside the indexing pipeline.
+
+    `submit(texts)` returns a Future immediately; the batch is classified on the
+    stage's own executor in groups of `backend.max_batch`, so the caller can keep
+    chunking and embedding and only collect the verdicts before storing vectors.
+    Verdicts are cached by sha256 of the moderated prefix, so re-indexing the same
+    content (force reprocess, retries) costs no API calls. Backend errors fail open
+    (documents are indexed unmoderated and the error is logged), matching the
+    previous per-document behavior.
+    """
+
+    def __init__(self, backend: ModerationBackend, max_chars: int = 1000,
+                 cache_size: int = 10000, workers: int = 2):
+        self.backend = backend
+        self.max_chars = max_chars
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, ModerationResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="moderation")
+        self.stats = {"requests": 0, "texts": 0, "cache_hits": 0, "api_calls": 0, "errors": 0, "flagged": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return not isinstance(self.backend, NullModerationBackend)
+
+    def submit(self, texts: Sequence[str]) -> "Future[List[Optional[ModerationResult]]]":
+        if not self.enabled:
+            future: Future = Future()
+            future.set_result([None] * len(texts))
+            return future
+        return self._executor.submit(self.moderate, list(texts))
+
+    def moderate(self, texts: Sequence[str]) -> List[Optional[ModerationResult]]:
+        """Classify texts synchronously; None marks a text the backend failed on."""
+        keys = [self._key(t) for t in texts]
+        results: List[Optional[ModerationResult]] = [None] * len(texts)
+        misses: Dict[str, List[int]] = {}
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["texts"] += len(texts)
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    results[i] = cached
+                    self.stats["cache_hits"] += 1
+                else:
+                    misses.setdefault(key, []).append(i)
+
+        miss_keys = list(misses)
+        step = max(1, self.backend.max_batch)
+        for start in range(0, len(miss_keys), step):
+            group = miss_keys[start:start + step]
+            inputs = [texts[misses[k][0]][:self.max_chars] for k in group]
+            try:
+                verdicts = self.backend.classify(inputs)
+                with self._lock:
+                    self.stats["api_calls"] += 1
+            except Exception as e:
+                logger.error("[Moderation] %s backend failed for %d texts: %s", self.backend.name, len(inputs), e)
+                with self._lock:
+                    self.stats["errors"] += 1
+                continue
+            with self._lock:
+                for key, verdict in zip(group, verdicts):
+                    for i in misses[key]:
+                        results[i] = verdict
+                    self._cache[key] = verdict
+                    if verdict.flagged:
+                        self.stats["flagged"] += 1
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, backend=self.backend.name, cache_entries=len(self._cache))
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256((text or "")[:self.max_chars].encode("utf-8", "ignore")).hexdigest()
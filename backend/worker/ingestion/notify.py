@@ -0,0 +1,134 @@
+import time
+import select
+import logging
+import threading
+from typing import Callable, Optional, Set
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+PENDING_CHANNEL = "documents_pending"
+
+# Installed by ensure_database_tables (and migrations/009_document_pending_notify.sql).
+# One NOTIFY per org per transaction: Postgres folds identical channel/payload pairs
+# raised inside one transaction, so a 25K-row CSV import wakes the worker once.
+PENDING_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_document_pending() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{PENDING_CHANNEL}', COALESCE(NEW.org_id::text, ''));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS documents_pending_insert ON documents;
+CREATE TRIGGER documents_pending_insert
+    AFTER INSERT ON documents
+    FOR EACH ROW WHEN (NEW.status = 'pending')
+    EXECUTE FUNCTION notify_document_pending();
+
+DROP TRIGGER IF EXISTS documents_pending_reset ON documents;
+CREATE TRIGGER documents_pending_reset
+    AFTER UPDATE OF status ON documents
+    FOR EACH ROW WHEN (NEW.status = 'pending' AND OLD.status IS DISTINCT FROM 'pending')
+    EXECUTE FUNCTION notify_document_pending();
+"""
+
+
+class PendingListener:
+    """
+    LISTENs on the documents_pending channel and hands org ids to `on_pending`
+    as soon as documents become pending. Notifications arriving within
+    `debounce` seconds are coalesced per org. A dedicated autocommit connection is
+    used (LISTEN cannot share pooled connections); after a reconnect `on_reconnect`
+    is called because notifications sent while disconnected are lost.
+    """
+
+    def __init__(self,
+                 dsn: str,
+                 on_pending: Callable[[int], None],
+                 on_reconnect: Optional[Callable[[], None]] = None,
+                 channel: str = PENDING_CHANNEL,
+                 debounce: float = 0.2,
+                 poll_timeout: float = 5.0):
+        self.dsn = dsn
+        self.on_pending = on_pending
+        self.on_reconnect = on_reconnect
+        self.channel = channel
+        self.debounce = debounce
+        self.poll_timeout = poll_timeout
+        self.notifications = 0
+        self.dispatches = 0
+        self.connected = False
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="pending-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def snapshot(self):
+        return {"channel": self.channel, "connected": self.connected,
+                "notifications": self.notifications, "dispatches": self.dispatches}
+
+    def _run(self):
+        backoff = 1.0
+        first = True
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel};")
+                self.connected = True
+                backoff = 1.0
+                logger.info("[Listener] Listening on '%s'", self.channel)
+                if not first and self.on_reconnect:
+                    self.on_reconnect()
+                first = False
+                self._listen(conn)
+            except Exception as e:
+                logger.error("[Listener] Connection error: %s (retrying in %.0fs)", e, backoff)
+            finally:
+                self.connected = False
+                if conn:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            first = False
+            self._stopped.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def _listen(self, conn):
+        while not self._stopped.is_set():
+            if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                continue
+            orgs: Set[int] = set()
+            deadline = time.monotonic() + self.debounce
+            while True:
+                conn.poll()
+                while conn.notifies:
+                    note = conn.notifies.pop(0)
+                    self.notifications += 1
+                    if note.payload:
+                        try:
+                            orgs.add(int(note.payload))
+                        except ValueError:
+                            pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or select.select([conn], [], [], remaining) == ([], [], []):
+                    break
+            for org_id in orgs:
+                self.dispatches += 1
+                try:
+                    self.on_pending(org_id)
+                except Exception as e:
+                    logger.error("[Listener] Dispatch for org_id=%s failed: %s", org_id, e)
@@ -0,0 +1,287 @@
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from lib.chunk_refs import CHUNK_ID_PREFIX, ChunkRefs
+from lib.rbac_partitions import is_partition
+
+logger = logging.getLogger(__name__)
+
+ORG_COLLECTION_RE = re.compile(r"^privacy_documents_(\d+)$")
+MAX_DOCUMENT_ID = 2 ** 31 - 1
+
+
+def document_key(metadata: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The documents row a chunk belongs to: "document_id" (upload jobs) or
+    "doc_id" (Deep Extract); None for chunks written without either."""
+    metadata = metadata or {}
+    for field in ("document_id", "doc_id"):
+        value = metadata.get(field)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+class ReconcilePass:
+    """Progress of one pass over a collection. "orphaned" counts orphans found in
+    scanned pages; "deleted" also counts chunks dropped along with the released
+    references of a dead document, wherever they are stored."""
+
+    def __init__(self):
+        self.offset = 0
+        self.live: Set[str] = set()
+        self.counts = {"scanned": 0, "orphaned": 0, "deleted": 0, "unattributed": 0, "unreferenced_kept": 0}
+        self.started_at = datetime.now()
+        self.pages = 0
+
+    def summary(self) -> Dict[str, Any]:
+        return dict(self.counts, offset=self.offset, pages=self.pages, started_at=self.started_at.isoformat())
+
+
+class OrphanReconciler:
+    """
+    Finds vectors whose document is gone and documents that lost their vectors.
+
+    Each collection is paged through by offset (ids and metadatas only). For
+    every page, the document keys of its chunks are checked against `documents`
+    in one query, and chunks of missing or 'deleted' documents are removed in
+    one bulk delete. Content-hash chunks are judged by chunk_refs instead:
+    references of dead documents are released (dropping the chunks nobody else
+    references), and chunks without any reference are pruned under the
+    chunk_refs lock unless their metadata still names a live document.
+    Chunks carrying no document key are counted, never deleted.
+
+    Memory stays bounded by the page size plus the set of live document keys
+    seen in the pass, which is used at the end of a pass to report processed
+    documents without any vector.
+
+    Every `interval` seconds the background loop scans at most `pages_per_run`
+    pages and resumes where it stopped on the next tick, so a pass over a large
+    corpus is spread out instead of hammering Chroma; a collection is passed
+    over again `pass_interval` seconds after its last pass finished. Chunks
+    deleted by other writers mid-pass shift offsets; anything skipped is picked
+    up by the next pass.
+    """
+
+    def __init__(self,
+                 get_conn: Callable[[], Any],
+                 put_conn: Callable[[Any], None],
+                 chunk_refs: ChunkRefs,
+                 list_collections: Callable[[], Iterable[str]],
+                 get_collection: Callable[[str], Any],
+                 drop_chunks: Callable[[Any, List[str]], None],
+                 interval: float = 60.0,
+                 pages_per_run: int = 20,
+                 pass_interval: float = 3600.0,
+                 page_size: int = 2000,
+                 dry_run: bool = False,
+                 missing_sample: int = 50):
+        self.get_conn = get_conn
+        self.put_conn = put_conn
+        self.chunk_refs = chunk_refs
+        self.list_collections = list_collections
+        self.get_collection = get_collection
+        self.drop_chunks = drop_chunks
+        self.interval = interval
+        self.pages_per_run = pages_per_run
+        self.pass_interval = pass_interval
+        self.page_size = page_size
+        self.dry_run = dry_run
+        self.missing_sample = missing_sample
+        self.last_run: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._passes: Dict[str, ReconcilePass] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._finished_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread or self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._loop, name="orphan-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "pages_per_run": self.pages_per_run,
+            "pass_interval_seconds": self.pass_interval,
+            "page_size": self.page_size,
+            "dry_run": self.dry_run,
+            "running": self._lock.locked(),
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_error": self.last_error,
+            "in_progress": {name: p.summary() for name, p in self._passes.items()},
+            "completed": dict(self._results),
+        }
+
+    def run_once(self, names: Optional[List[str]] = None, max_pages: Optional[int] = None,
+                 dry_run: Optional[bool] = None) -> int:
+        """Continue (or start) passes over `names` for up to `max_pages` pages in
+        total (default pages_per_run; 0 = unbounded). Without `names`, every base
+        collection whose last pass is older than pass_interval. Returns the
+        number of pages scanned."""
+        dry_run = self.dry_run if dry_run is None else dry_run
+        budget = self.pages_per_run if max_pages is None else max_pages
+        scanned = 0
+        with self._lock:
+            if names is None:
+                listed = [n for n in self.list_collections() if n.startswith("privacy_documents") and not is_partition(n)]
+                for gone in set(self._passes) - set(listed):
+                    del self._passes[gone]
+                now = time.time()
+                names = sorted(n for n in listed if n in self._passes
+                               or now - self._finished_at.get(n, 0.0) >= self.pass_interval)
+            for name in names:
+                collection = self.get_collection(name)
+                state = self._passes.setdefault(name, ReconcilePass())
+                while not budget or scanned < budget:
+                    if not self._scan_page(collection, state, dry_run):
+                        self._finish(name, state, dry_run)
+                        break
+                    scanned += 1
+                if budget and scanned >= budget:
+                    break
+            self.last_run = datetime.now()
+        return scanned
+
+    def reconcile(self, name: str, dry_run: Optional[bool] = None) -> Dict[str, Any]:
+        """A complete pass over one collection, from the start."""
+        with self._lock:
+            self._passes.pop(name, None)
+        self.run_once([name], max_pages=0, dry_run=dry_run)
+        return self._results.get(name, {})
+
+    def _scan_page(self, collection, state: ReconcilePass, dry_run: bool) -> bool:
+        page = collection.get(include=["metadatas"], limit=self.page_size, offset=state.offset)
+        ids = page.get("ids") or []
+        if not ids:
+            return False
+        metadatas = page.get("metadatas") or [None] * len(ids)
+        keys = {chunk_id: document_key(meta) for chunk_id, meta in zip(ids, metadatas)}
+        content = [chunk_id for chunk_id in ids if chunk_id.startswith(CHUNK_ID_PREFIX)]
+        refs = self.chunk_refs.references(collection.name, content)
+
+        candidates = {k for k in keys.values() if k is not None}
+        for documents in refs.values():
+            candidates |= documents
+        live = self._live_documents(candidates)
+        state.live |= live
+
+        orphans = [chunk_id for chunk_id, key in keys.items()
+                   if not chunk_id.startswith(CHUNK_ID_PREFIX) and key is not None and key not in live]
+        dead_refs = {d for documents in refs.values() for d in documents if d not in live}
+        unreferenced = []
+        for chunk_id in content:
+            if refs.get(chunk_id):
+                continue
+            if keys[chunk_id] is not None and keys[chunk_id] in live:
+                # Stored before its references were recorded (or restored without them)
+                state.counts["unreferenced_kept"] += 1
+            else:
+                unreferenced.append(chunk_id)
+        state.counts["unattributed"] += sum(1 for chunk_id, key in keys.items()
+                                            if key is None and not chunk_id.startswith(CHUNK_ID_PREFIX))
+        state.counts["orphaned"] += len(orphans) + len(unreferenced) + sum(
+            1 for chunk_id in content if refs.get(chunk_id) and not refs[chunk_id] & live)
+
+        deleted = 0
+        if not dry_run:
+            drop = lambda chunk_ids: self.drop_chunks(collection, chunk_ids)
+            if orphans:
+                drop(orphans)
+                deleted += len(orphans)
+            for document in sorted(dead_refs):
+                dropped, _ = self.chunk_refs.release(collection.name, document, drop)
+                deleted += len(dropped)
+            deleted += len(self.chunk_refs.prune(collection.name, unreferenced, drop))
+        if deleted:
+            logger.info("[Reconcile] %s: deleted %d orphaned chunks at offset %d", collection.name, deleted,
+                        state.offset)
+        state.counts["scanned"] += len(ids)
+        state.counts["deleted"] += deleted
+        state.pages += 1
+        # Deleted chunks shift what follows; stepping back too far only rescans a few chunks
+        state.offset += max(len(ids) - deleted, 0)
+        return True
+
+    def _finish(self, name: str, state: ReconcilePass, dry_run: bool):
+        result = state.summary()
+        result.update(finished_at=datetime.now().isoformat(), dry_run=dry_run,
+                      seconds=round((datetime.now() - state.started_at).total_seconds(), 1))
+        match = ORG_COLLECTION_RE.match(name)
+        if match:
+            missing, sample = self._missing_vectors(int(match.group(1)), state.live)
+            result.update(missing_vectors=missing, missing_sample=sample)
+            if missing:
+                logger.warning("[Reconcile] %s: %d processed documents have no vectors", name, missing)
+        self._results[name] = result
+        self._finished_at[name] = time.time()
+        del self._passes[name]
+        logger.info("[Reconcile] %s: pass done (%s)", name,
+                    ", ".join(f"{k} {v}" for k, v in state.counts.items()))
+
+    def _live_documents(self, keys: Set[str]) -> Set[str]:
+        """The keys (documents.id, or file_key for jobs without one) of rows that exist and are not deleted."""
+        if not keys:
+            return set()
+        ids = [int(k) for k in keys if k.isdigit() and int(k) <= MAX_DOCUMENT_ID]
+        file_keys = [k for k in keys if not k.isdigit()]
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT id, file_key FROM documents
+                    WHERE (id = ANY(%s) OR file_key = ANY(%s)) AND status IS DISTINCT FROM 'deleted'
+                """, (ids, file_keys))
+                rows = cur.fetchall()
+            conn.commit()
+        finally:
+            self.put_conn(conn)
+        live = set()
+        for doc_id, file_key in rows:
+            live.update(k for k in (str(doc_id), file_key) if k in keys)
+        return live
+
+    def _missing_vectors(self, org_id: int, live: Set[str], batch: int = 5000):
+        """Processed documents of the org with no chunk seen in the pass: (count, sample)."""
+        missing, sample, last_id = 0, [], 0
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                while True:
+                    cur.execute("""
+                        SELECT id, file_key, filename FROM documents
+                        WHERE org_id = %s AND status = 'processed' AND id > %s
+                        ORDER BY id LIMIT %s
+                    """, (org_id, last_id, batch))
+                    rows = cur.fetchall()
+                    if not rows:
+                        break
+                    for doc_id, file_key, filename in rows:
+                        if str(doc_id) not in live and file_key not in live:
+                            missing += 1
+                            if len(sample) < self.missing_sample:
+                                sample.append({"id": doc_id, "filename": filename})
+                    last_id = rows[-1][0]
+            conn.commit()
+        finally:
+            self.put_conn(conn)
+        return missing, sample
+
+    def _loop(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("[Reconcile] Run failed: %s", e)
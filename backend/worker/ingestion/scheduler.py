@@ -0,0 +1,289 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+
+
+def parse_org_weights(raw: Optional[str]) -> Dict[int, float]:
+    """Parse "org_id:weight" pairs such as "1:0.5,7:2" into a dict."""
+    weights = {}
+    if not raw:
+        return weights
+    for part in raw.replace(";", ",").split(","):
+        if ":" not in part:
+            continue
+        org, weight = part.split(":", 1)
+        try:
+            weights[int(org.strip())] = max(float(weight.strip()), 0.01)
+        except ValueError:
+            logger.warning("[Scheduler] Ignoring malformed org weight '%s'", part)
+    return weights
+
+
+class _OrgState:
+    def __init__(self, org_id: int, weight: float):
+        self.org_id = org_id
+        self.weight = weight
+        self.pending = 0
+        self.in_flight = 0
+        self.vtime = 0.0
+        self.lane = LANE_BULK
+        self.interactive_credit = 0
+        self.paused = False
+        self.slices_run = 0
+        self.docs_handled = 0
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing of background indexing across organizations.
+
+    Work is dispatched as small slices (at most `slice_size` documents of one org)
+    instead of draining an org to completion, so a 25K-document backfill no longer
+    blocks other tenants. Each org carries a virtual time that advances by
+    slice_size / weight whenever one of its slices is dispatched; the runnable org
+    with the smallest virtual time goes next. Orgs with only a handful of pending
+    documents are served from a priority lane ahead of bulk backfills; an explicit
+    interactive submission grants an org interactive credit for that many documents
+    so a small upload into a tenant that is mid-reindex is picked up newest-first
+    without promoting its whole backlog. `per_org_cap` bounds concurrent slices per org.
+
+    Paused orgs (their job was cancelled) are not dispatched. With `fetch_paused`
+    the persisted set is re-read on every scan, so a pause survives restarts and
+    an org resumed elsewhere (e.g. by a new upload) is picked up again.
+    """
+
+    def __init__(self,
+                 run_slice: Callable[[int, int, str], int],
+                 fetch_pending: Callable[[], Dict[int, int]],
+                 workers: int = 4,
+                 slice_size: int = 25,
+                 per_org_cap: int = 2,
+                 interactive_threshold: int = 50,
+                 scan_interval: float = 15.0,
+                 weights: Optional[Dict[int, float]] = None,
+                 default_weight: float = 1.0,
+                 fetch_paused: Optional[Callable[[], Optional[Iterable[int]]]] = None):
+        self.run_slice = run_slice
+        self.fetch_pending = fetch_pending
+        self.fetch_paused = fetch_paused
+        self.workers = max(1, workers)
+        self.slice_size = max(1, slice_size)
+        self.per_org_cap = max(1, per_org_cap)
+        self.interactive_threshold = interactive_threshold
+        self.scan_interval = scan_interval
+        self.weights = weights or {}
+        self.default_weight = default_weight
+
+        self._orgs: Dict[int, _OrgState] = {}
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._next_scan = 0.0
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._thread:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="autoindex")
+        self._thread = threading.Thread(target=self._loop, name="autoindex-scheduler", daemon=True)
+        self._thread.start()
+        logger.info("[Scheduler] Started (workers=%d slice=%d per_org_cap=%d scan=%ss)",
+                    self.workers, self.slice_size, self.per_org_cap, self.scan_interval)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def submit(self, org_id: int, lane: Optional[str] = None, pending_hint: Optional[int] = None,
+               resume: bool = True):
+        """Mark an org as having work. Interactive submissions jump the bulk queue.
+        With resume=False (change notifications) a paused org stays paused."""
+        with self._cond:
+            org = self._get_org(org_id)
+            if org.paused and not resume:
+                return
+            org.paused = False
+            hint = pending_hint if pending_hint else self.slice_size
+            if org.pending == 0 and org.in_flight == 0:
+                org.vtime = max(org.vtime, self._virtual_clock())
+            # Unknown amount of work still gets at least one slice; the next scan corrects it
+            org.pending = max(org.pending, hint)
+            if lane == LANE_INTERACTIVE:
+                org.interactive_credit += hint
+            self._classify(org)
+            self._cond.notify_all()
+
+    def pause(self, org_id: int):
+        """Stop dispatching an org (e.g. after its job was cancelled) until it is submitted again."""
+        with self._cond:
+            org = self._get_org(org_id)
+            org.paused = True
+            org.pending = 0
+            org.interactive_credit = 0
+
+    def is_paused(self, org_id: int) -> bool:
+        with self._cond:
+            org = self._orgs.get(org_id)
+            return bool(org and org.paused)
+
+    def trigger_scan(self):
+        """Force a pending-document rescan on the next loop iteration."""
+        with self._cond:
+            self._next_scan = 0.0
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                "slice_size": self.slice_size,
+                "per_org_cap": self.per_org_cap,
+                "orgs": [
+                    {
+                        "org_id": o.org_id,
+                        "lane": o.lane,
+                        "paused": o.paused,
+                        "weight": o.weight,
+                        "pending": o.pending,
+                        "interactive_credit": o.interactive_credit,
+                        "in_flight": o.in_flight,
+                        "virtual_time": round(o.vtime, 3),
+                        "slices_run": o.slices_run,
+                        "docs_handled": o.docs_handled,
+                    }
+                    for o in sorted(self._orgs.values(), key=lambda s: s.org_id)
+                ],
+            }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _get_org(self, org_id: int) -> _OrgState:
+        org = self._orgs.get(org_id)
+        if org is None:
+            org = _OrgState(org_id, self.weights.get(org_id, self.default_weight))
+            # A newly active org starts at the current virtual clock so it cannot
+            # bank credit while idle and then monopolise the workers.
+            org.vtime = self._virtual_clock()
+            self._orgs[org_id] = org
+        return org
+
+    def _virtual_clock(self) -> float:
+        active = [o.vtime for o in self._orgs.values() if o.pending > 0 or o.in_flight > 0]
+        return min(active) if active else 0.0
+
+    def _classify(self, org: _OrgState):
+        if org.interactive_credit > 0 or org.pending <= self.interactive_threshold:
+            org.lane = LANE_INTERACTIVE
+        else:
+            org.lane = LANE_BULK
+
+    def _rescan(self):
+        try:
+            pending = self.fetch_pending()
+        except Exception as e:
+            logger.error("[Scheduler] Pending scan failed: %s", e)
+            return
+        paused = None
+        if self.fetch_paused:
+            try:
+                paused = self.fetch_paused()
+            except Exception as e:
+                logger.error("[Scheduler] Paused-org scan failed: %s", e)
+        with self._cond:
+            if paused is not None:
+                paused = set(paused)
+                for org_id in paused:
+                    org = self._get_org(org_id)
+                    org.paused, org.pending, org.interactive_credit = True, 0, 0
+                for org_id, org in self._orgs.items():
+                    if org.paused and org_id not in paused:
+                        logger.info("[Scheduler] org_id=%s resumed", org_id)
+                        org.paused = False
+            clock = self._virtual_clock()
+            for org_id, org in self._orgs.items():
+                if org_id not in pending and org.in_flight == 0:
+                    org.pending = 0
+                    org.interactive_credit = 0
+            for org_id, count in pending.items():
+                org = self._get_org(org_id)
+                if org.paused:
+                    continue
+                if org.pending == 0 and org.in_flight == 0:
+                    org.vtime = max(org.vtime, clock)
+                org.pending = count
+                self._classify(org)
+        if pending:
+            logger.info("[Scheduler] Pending documents per org: %s", pending)
+
+    def _pick(self) -> Optional[_OrgState]:
+        candidates = [o for o in self._orgs.values()
+                      if o.pending > 0 and not o.paused and o.in_flight < self.per_org_cap]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda o: (o.lane != LANE_INTERACTIVE, o.vtime, o.org_id))
+
+    def _dispatch(self):
+        while self._in_flight < self.workers:
+            org = self._pick()
+            if org is None:
+                return
+            size = min(self.slice_size, org.pending)
+            lane = org.lane
+            if org.interactive_credit > 0:
+                org.interactive_credit = max(0, org.interactive_credit - size)
+            org.in_flight += 1
+            org.pending -= size
+            org.vtime += size / org.weight
+            self._classify(org)
+            self._in_flight += 1
+            self._executor.submit(self._run, org.org_id, size, lane)
+
+    def _run(self, org_id: int, size: int, lane: str):
+        handled = 0
+        try:
+            handled = self.run_slice(org_id, size, lane) or 0
+        except Exception as e:
+            logger.error("[Scheduler] Slice failed for org_id=%s: %s", org_id, e)
+        finally:
+            with self._cond:
+                org = self._get_org(org_id)
+                org.in_flight -= 1
+                org.slices_run += 1
+                org.docs_handled += handled
+                self._in_flight -= 1
+                if handled >= size:
+                    # Slice was full, so there is probably more work behind it
+                    org.pending = max(org.pending, self.slice_size)
+                elif org.in_flight == 0:
+                    org.pending = 0
+                    org.interactive_credit = 0
+                self._classify(org)
+                self._cond.notify_all()
+
+    def _loop(self):
+        while True:
+            if time.time() >= self._next_scan:
+                self._next_scan = time.time() + self.scan_interval
+                self._rescan()
+            with self._cond:
+                if self._stopped:
+                    return
+                self._dispatch()
+                timeout = max(0.0, self._next_scan - time.time())
+                self._cond.wait(timeout=timeout)
@@ -0,0 +1,164 @@
+# worker/lib/blind_index.py
+"""
+Keyed blind index for exact entity-ID lookup (table entity_blind_index).
+
+Every entity ID found in a stored chunk (PES/STU/RES/INT tokens, plus the
+chunk's student_id metadata) is recorded as HMAC-SHA256(key, ID) -> chunk id,
+so the hybrid search resolves IDs with one indexed Postgres lookup instead of
+scanning document text, and the table never holds the IDs in clear.
+
+A collection counts as indexed once a rebuild has scanned all of its chunks
+(table entity_blind_index_state), not when it has rows: collections without
+any entity IDs have none.
+"""
+import hmac
+import time
+import hashlib
+import logging
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+# Same shape the redaction step keeps readable for search matching
+ENTITY_ID_PATTERN = re.compile(r'\b(?:PES|STU|RES|INT)[A-Z0-9]*\d[A-Z0-9]*\b', re.IGNORECASE)
+
+
+def extract_entity_ids(text: Optional[str]) -> List[str]:
+    """Distinct entity IDs in `text`, upper-cased, in order of appearance."""
+    seen = {}
+    for match in ENTITY_ID_PATTERN.finditer(text or ""):
+        seen.setdefault(match.group(0).upper(), None)
+    return list(seen)
+
+
+class BlindIndex:
+    """HMAC token -> chunk id index, scoped per Chroma collection."""
+
+    def __init__(self, key: str, get_conn: Callable[[], Any], put_conn: Callable[[Any], None]):
+        self._key = key.encode("utf-8")
+        self.get_conn = get_conn
+        self.put_conn = put_conn
+
+    def token(self, entity_id: str) -> str:
+        return hmac.new(self._key, entity_id.strip().upper().encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def index_chunks(self, collection: str, ids: Sequence[str], documents: Sequence[Optional[str]],
+                     metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None) -> int:
+        """(Re)index chunks; rows of re-added chunk ids are replaced. Returns rows written."""
+        rows = []
+        for i, chunk_id in enumerate(ids):
+            metadata = (metadatas[i] if metadatas else None) or {}
+            entity_ids: Set[str] = set(extract_entity_ids(documents[i] if documents else None))
+            if metadata.get("student_id"):
+                entity_ids.add(str(metadata["student_id"]).upper())
+            document_id = metadata.get("document_id") or metadata.get("doc_id")
+            document_id = str(document_id) if document_id not in (None, "") else None
+            rows.extend((collection, self.token(e), chunk_id, document_id) for e in entity_ids)
+
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM entity_blind_index WHERE collection_name = %s AND chunk_id = ANY(%s)",
+                            (collection, list(ids)))
+                if rows:
+                    execute_values(cur, """
+                        INSERT INTO entity_blind_index (collection_name, token, chunk_id, document_id)
+                        VALUES %s ON CONFLICT DO NOTHING
+                    """, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
+        return len(rows)
+
+    def lookup(self, collection: str, entity_ids: Iterable[str], limit: int = 200) -> List[str]:
+        """Chunk ids containing any of `entity_ids`, in one query."""
+        tokens = [self.token(e) for e in entity_ids]
+        if not tokens:
+            return []
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT chunk_id FROM entity_blind_index
+                    WHERE collection_name = %s AND token = ANY(%s)
+                    GROUP BY chunk_id
+                    ORDER BY COUNT(*) DESC, chunk_id
+                    LIMIT %s
+                """, (collection, tokens, limit))
+                chunk_ids = [row[0] for row in cur.fetchall()]
+            conn.commit()
+            return chunk_ids
+        finally:
+            self.put_conn(conn)
+
+    def delete(self, collection: str, document_id: Optional[str] = None, chunk_ids: Optional[Sequence[str]] = None):
+        """Drop the rows of some chunks, of one document, or of the whole collection."""
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                if chunk_ids is not None:
+                    cur.execute("DELETE FROM entity_blind_index WHERE collection_name = %s AND chunk_id = ANY(%s)",
+                                (collection, list(chunk_ids)))
+                elif document_id is None:
+                    cur.execute("DELETE FROM entity_blind_index WHERE collection_name = %s", (collection,))
+                    cur.execute("DELETE FROM entity_blind_index_state WHERE collection_name = %s", (collection,))
+                else:
+                    cur.execute("DELETE FROM entity_blind_index WHERE collection_name = %s AND document_id = %s",
+                                (collection, str(document_id)))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
+
+    def indexed_collections(self) -> List[str]:
+        """Collections whose last rebuild completed (live writes keep them current)."""
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT collection_name FROM entity_blind_index_state WHERE completed_at IS NOT NULL")
+                names = [row[0] for row in cur.fetchall()]
+            conn.commit()
+            return names
+        finally:
+            self.put_conn(conn)
+
+    def rebuild(self, collection, page_size: int = 1000) -> int:
+        """Re-index every chunk already stored in a Chroma collection. Returns chunks scanned."""
+        started = time.time()
+        self.delete(collection.name)
+        scanned = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=scanned)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            self.index_chunks(collection.name, ids, page.get("documents") or [None] * len(ids), page.get("metadatas"))
+            scanned += len(ids)
+        self._mark_complete(collection.name, scanned)
+        logger.info("[BlindIndex] Rebuilt %s: %d chunks in %.1fs", collection.name, scanned, time.time() - started)
+        return scanned
+
+    def _mark_complete(self, collection: str, scanned: int):
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO entity_blind_index_state (collection_name, chunks_scanned, completed_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (collection_name) DO UPDATE
+                    SET chunks_scanned = EXCLUDED.chunks_scanned, completed_at = EXCLUDED.completed_at
+                """, (collection, scanned))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
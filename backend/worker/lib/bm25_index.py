@@ -0,0 +1,327 @@
+# worker/lib/bm25_index.py
+"""
+Per-collection BM25 lexical index, fused with vector results by reciprocal rank.
+
+Each org collection gets an in-memory inverted index (term -> {docno: tf})
+maintained incrementally by chromadb_add / deletes and persisted as a gzip
+pickle under BM25_INDEX_DIR. Removed chunks are tombstoned and dropped when the
+index is compacted on save. The per-chunk RBAC fields (access_level,
+uploaded_by) are kept so lexical hits honour the same where filter as the
+vector query.
+"""
+import os
+import re
+import gzip
+import heapq
+import math
+import time
+import pickle
+import logging
+import threading
+from collections import Counter
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in is it its me my of on or our she so
+that the their them there these they this to was we were what when where which who whom why will
+with you your about all any can do does did how into not no than then tell show give list find get
+""".split())
+RBAC_FIELDS = ("access_level", "uploaded_by")
+STATE_VERSION = 1
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall((text or "").lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def where_matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate the equality / $in filters search_documents builds against stored RBAC fields."""
+    for key, condition in (where or {}).items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$eq" in condition and value != condition["$eq"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Ids ordered by sum(1 / (k + rank)) over the given rankings (rank starts at 1)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item_id: scores[item_id], reverse=True)
+
+
+class BM25Index:
+    """Inverted index of one collection. Chunk ids map to dense docnos; a
+    re-added or removed chunk leaves a tombstone until `compact`."""
+
+    def __init__(self, name: str, k1: float = 1.2, b: float = 0.75):
+        self.name = name
+        self.k1 = k1
+        self.b = b
+        self.complete = False  # set once built from everything already in Chroma
+        self.dirty = False
+        self._ids: List[Optional[str]] = []
+        self._lengths: List[int] = []
+        self._meta: List[Optional[tuple]] = []  # (access_level, uploaded_by, document_id)
+        self._docnos: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docnos)
+
+    def add(self, ids: Sequence[str], documents: Sequence[Optional[str]],
+            metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None):
+        with self._lock:
+            for i, chunk_id in enumerate(ids):
+                self._remove_one(chunk_id)
+                metadata = (metadatas[i] if metadatas else None) or {}
+                terms = Counter(tokenize(documents[i] if documents else None))
+                docno = len(self._ids)
+                document_id = metadata.get("document_id") or metadata.get("doc_id")
+                self._ids.append(chunk_id)
+                self._lengths.append(sum(terms.values()))
+                self._meta.append(tuple(metadata.get(f) for f in RBAC_FIELDS) +
+                                  (str(document_id) if document_id not in (None, "") else None,))
+                self._docnos[chunk_id] = docno
+                self._total_length += self._lengths[docno]
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[docno] = tf
+            self.dirty = True
+
+    def remove(self, ids: Sequence[str]):
+        with self._lock:
+            for chunk_id in ids:
+                self._remove_one(chunk_id)
+            self.dirty = True
+
+    def remove_document(self, document_id: Any) -> int:
+        document_id = str(document_id)
+        with self._lock:
+            ids = [self._ids[n] for n in self._docnos.values() if self._meta[n][-1] == document_id]
+            self.remove(ids)
+            return len(ids)
+
+    def search(self, query: str, k: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, score) for `query` among chunks matching `where`."""
+        terms = set(tokenize(query))
+        with self._lock:
+            live = len(self._docnos)
+            if not terms or not live:
+                return []
+            avg_length = self._total_length / live
+            scores: Dict[int, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                # Tombstoned docnos stay in postings until compaction; df is close enough
+                idf = math.log(1 + (live - len(postings) + 0.5) / (len(postings) + 0.5))
+                for docno, tf in postings.items():
+                    if self._ids[docno] is None:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[docno] / avg_length)
+                    scores[docno] = scores.get(docno, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            candidates = scores.items()
+            if where:
+                candidates = [(docno, score) for docno, score in candidates
+                              if where_matches(dict(zip(RBAC_FIELDS, self._meta[docno])), where)]
+            return [(self._ids[docno], score) for docno, score in heapq.nlargest(k, candidates, key=itemgetter(1))]
+
+    def compact(self):
+        """Renumber live chunks and drop tombstones from the postings."""
+        with self._lock:
+            if len(self._docnos) == len(self._ids):
+                return
+            remap = {}
+            ids, lengths, meta = [], [], []
+            for old, chunk_id in enumerate(self._ids):
+                if chunk_id is None:
+                    continue
+                remap[old] = len(ids)
+                ids.append(chunk_id)
+                lengths.append(self._lengths[old])
+                meta.append(self._meta[old])
+            postings = {}
+            for term, entries in self._postings.items():
+                kept = {remap[n]: tf for n, tf in entries.items() if n in remap}
+                if kept:
+                    postings[term] = kept
+            self._ids, self._lengths, self._meta, self._postings = ids, lengths, meta, postings
+            self._docnos = {chunk_id: n for n, chunk_id in enumerate(ids)}
+
+    def dumps(self) -> bytes:
+        """Compact and pickle under the lock, so writers never mutate what is being serialized."""
+        with self._lock:
+            self.compact()
+            self.dirty = False
+            return pickle.dumps({"version": STATE_VERSION, "name": self.name, "complete": self.complete,
+                                 "ids": self._ids, "lengths": self._lengths, "meta": self._meta,
+                                 "postings": self._postings}, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "BM25Index":
+        index = cls(state["name"])
+        index.complete = state["complete"]
+        index._ids, index._lengths, index._meta = state["ids"], state["lengths"], state["meta"]
+        index._postings = state["postings"]
+        index._docnos = {chunk_id: n for n, chunk_id in enumerate(index._ids)}
+        index._total_length = sum(index._lengths)
+        return index
+
+    def _remove_one(self, chunk_id: str):
+        docno = self._docnos.pop(chunk_id, None)
+        if docno is not None:
+            self._ids[docno] = None
+            self._total_length -= self._lengths[docno]
+
+
+class BM25Store:
+    """BM25 indexes of all collections: lazily loaded from `directory`,
+    flushed every `flush_interval` seconds when changed."""
+
+    def __init__(self, directory: str, flush_interval: float = 30.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._indexes: Dict[str, BM25Index] = {}
+        self._rebuilding: Dict[str, list] = {}  # name -> writes to replay onto the rebuilt index
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._loop, name="bm25-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def get(self, name: str, create: bool = False) -> Optional[BM25Index]:
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is None:
+                index = self._load(name)
+                if index is None and create:
+                    index = BM25Index(name)
+                if index is not None:
+                    self._indexes[name] = index
+            return index
+
+    def add(self, name: str, ids: Sequence[str], documents: Sequence[Optional[str]],
+            metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None):
+        self.get(name, create=True).add(ids, documents, metadatas)
+        self._record(name, "add", ids, documents, metadatas)
+
+    def remove(self, name: str, ids: Optional[Sequence[str]] = None, document_id: Optional[Any] = None):
+        index = self.get(name)
+        if index is None:
+            return
+        if ids:
+            index.remove(ids)
+            self._record(name, "remove", ids)
+        if document_id is not None:
+            index.remove_document(document_id)
+            self._record(name, "remove_document", document_id)
+
+    def drop(self, name: str):
+        with self._lock:
+            self._indexes.pop(name, None)
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def search(self, name: str, query: str, k: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        index = self.get(name)
+        return index.search(query, k, where) if index is not None else []
+
+    def rebuild(self, collection, page_size: int = 1000) -> int:
+        """Build a fresh index from every chunk in a Chroma collection and swap it in."""
+        started = time.time()
+        index = BM25Index(collection.name)
+        with self._lock:
+            self._rebuilding[collection.name] = []
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            index.add(ids, page.get("documents") or [None] * len(ids), page.get("metadatas"))
+            offset += len(ids)
+        index.complete = True
+        with self._lock:
+            # Writes that landed while paging through Chroma
+            for op, *args in self._rebuilding.pop(collection.name, []):
+                getattr(index, op)(*args)
+            self._indexes[collection.name] = index
+        self._save(index)
+        logger.info("[BM25] Rebuilt %s: %d chunks in %.1fs", collection.name, offset, time.time() - started)
+        return offset
+
+    def needs_rebuild(self, name: str) -> bool:
+        index = self.get(name)
+        return index is None or not index.complete
+
+    def flush(self):
+        with self._lock:
+            dirty = [index for index in self._indexes.values() if index.dirty]
+        for index in dirty:
+            try:
+                self._save(index)
+            except Exception as e:
+                logger.error("[BM25] Could not persist %s: %s", index.name, e)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: {"chunks": len(index), "terms": len(index._postings), "complete": index.complete}
+                    for name, index in self._indexes.items()}
+
+    def _record(self, name: str, op: str, *args):
+        with self._lock:
+            if name in self._rebuilding:
+                self._rebuilding[name].append((op,) + args)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.bm25.gz")
+
+    def _save(self, index: BM25Index):
+        os.makedirs(self.directory, exist_ok=True)
+        data = index.dumps()
+        tmp = self._path(index.name) + ".tmp"
+        with gzip.open(tmp, "wb", compresslevel=3) as f:
+            f.write(data)
+        os.replace(tmp, self._path(index.name))
+
+    def _load(self, name: str) -> Optional[BM25Index]:
+        try:
+            with gzip.open(self._path(name), "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("[BM25] Discarding unreadable index %s: %s", name, e)
+            return None
+        if state.get("version") != STATE_VERSION:
+            return None
+        return BM25Index.from_state(state)
+
+    def _loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
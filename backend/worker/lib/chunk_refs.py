@@ -0,0 +1,167 @@
+# worker/lib/chunk_refs.py
+"""
+Content-addressed chunk ids and per-document references (table chunk_refs).
+
+With CHUNK_DEDUP a chunk's id is a hash of its collection, its access scope
+and its normalised text, so the same rows uploaded twice, or repeated across
+files, map to one stored vector. chunk_refs records which documents contain
+each chunk: ingestion only embeds ids that are not stored yet, and removing a
+document only deletes the vectors no other document references.
+
+The access scope (access_level, plus uploaded_by for "general" chunks) is part
+of the id because the RBAC filters match on those metadata fields; identical
+text under different access rules stays separate. A shared chunk keeps the
+metadata (document_id, filename) of the document that stored it first.
+
+Reference changes take a per-collection advisory lock and delete orphaned
+vectors before committing, so a concurrent upload either sees its chunk
+deleted (and re-embeds it) or keeps it alive with its own reference.
+"""
+import hashlib
+import logging
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ID_PREFIX = "c_"
+
+
+def normalise_chunk(text: str) -> str:
+    """Unicode NFKC with whitespace runs collapsed (line endings, CSV padding)."""
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+def access_scope(metadata: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+    metadata = metadata or {}
+    access_level = str(metadata.get("access_level") or "")
+    uploaded_by = metadata.get("uploaded_by") if access_level == "general" else None
+    return access_level, "" if uploaded_by in (None, "") else str(uploaded_by)
+
+
+def content_chunk_id(collection: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    digest = hashlib.sha256("\x1f".join((collection, *access_scope(metadata), normalise_chunk(text))).encode("utf-8"))
+    return CHUNK_ID_PREFIX + digest.hexdigest()[:40]
+
+
+class ChunkRefs:
+    """Which documents reference which chunk ids, per collection."""
+
+    def __init__(self, get_conn: Callable[[], Any], put_conn: Callable[[Any], None]):
+        self.get_conn = get_conn
+        self.put_conn = put_conn
+
+    def replace(self, collection: str, document_id: str, chunk_ids: Sequence[str],
+                drop_chunks: Callable[[List[str]], None]) -> Tuple[List[str], Set[str]]:
+        """
+        Make `chunk_ids` the references of `document_id`. Chunks it no longer
+        references and nobody else does are passed to `drop_chunks` (inside the
+        transaction; a failure keeps the references). Returns (dropped chunk
+        ids, released chunk ids still referenced by other documents).
+        """
+        document_id = str(document_id)
+        wanted = list(dict.fromkeys(chunk_ids))
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", ("chunk_refs:" + collection,))
+                cur.execute("DELETE FROM chunk_refs WHERE collection_name = %s AND document_id = %s "
+                            "AND NOT (chunk_id = ANY(%s)) RETURNING chunk_id",
+                            (collection, document_id, wanted))
+                released = [row[0] for row in cur.fetchall()]
+                if wanted:
+                    execute_values(cur, "INSERT INTO chunk_refs (collection_name, chunk_id, document_id) VALUES %s "
+                                        "ON CONFLICT DO NOTHING",
+                                   [(collection, chunk_id, document_id) for chunk_id in wanted], page_size=1000)
+                shared: Set[str] = set()
+                if released:
+                    cur.execute("SELECT DISTINCT chunk_id FROM chunk_refs WHERE collection_name = %s AND chunk_id = ANY(%s)",
+                                (collection, released))
+                    shared = {row[0] for row in cur.fetchall()}
+                orphans = [chunk_id for chunk_id in released if chunk_id not in shared]
+                if orphans:
+                    drop_chunks(orphans)
+            conn.commit()
+            return orphans, shared
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
+
+    def release(self, collection: str, document_id: str,
+                drop_chunks: Callable[[List[str]], None]) -> Tuple[List[str], Set[str]]:
+        """Remove every reference of a document (see replace)."""
+        return self.replace(collection, document_id, [], drop_chunks)
+
+    def references(self, collection: str, chunk_ids: Sequence[str]) -> Dict[str, Set[str]]:
+        """Documents referencing each of `chunk_ids` (ids without references are absent)."""
+        if not chunk_ids:
+            return {}
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT chunk_id, document_id FROM chunk_refs WHERE collection_name = %s AND chunk_id = ANY(%s)",
+                            (collection, list(chunk_ids)))
+                rows = cur.fetchall()
+            conn.commit()
+        finally:
+            self.put_conn(conn)
+        refs: Dict[str, Set[str]] = {}
+        for chunk_id, document_id in rows:
+            refs.setdefault(chunk_id, set()).add(document_id)
+        return refs
+
+    def prune(self, collection: str, chunk_ids: Sequence[str], drop_chunks: Callable[[List[str]], None]) -> List[str]:
+        """Pass the chunks among `chunk_ids` that nobody references to `drop_chunks`,
+        under the same lock as replace so a concurrent upload cannot claim them
+        in between. Returns the dropped ids."""
+        if not chunk_ids:
+            return []
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", ("chunk_refs:" + collection,))
+                cur.execute("SELECT DISTINCT chunk_id FROM chunk_refs WHERE collection_name = %s AND chunk_id = ANY(%s)",
+                            (collection, list(chunk_ids)))
+                referenced = {row[0] for row in cur.fetchall()}
+                orphans = [chunk_id for chunk_id in dict.fromkeys(chunk_ids) if chunk_id not in referenced]
+                if orphans:
+                    drop_chunks(orphans)
+            conn.commit()
+            return orphans
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
+
+    def drop(self, collection: str):
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM chunk_refs WHERE collection_name = %s", (collection,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per collection: distinct chunks, references and documents (references - chunks = vectors saved)."""
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT collection_name, COUNT(DISTINCT chunk_id), COUNT(*), COUNT(DISTINCT document_id)
+                    FROM chunk_refs GROUP BY collection_name ORDER BY collection_name
+                """)
+                rows = cur.fetchall()
+            conn.commit()
+        finally:
+            self.put_conn(conn)
+        return {name: {"chunks": chunks, "references": refs, "documents": documents, "deduplicated": refs - chunks}
+                for name, chunks, refs, documents in rows}
@@ -0,0 +1,88 @@
+# worker/lib/collection_cache.py
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionCache:
+    """
+    TTL-bound cache of Chroma collection handles keyed by collection name.
+
+    `get(name, factory)` returns the cached handle or calls `factory()` (one
+    get_or_create_collection round trip) at most once per name at a time, even
+    when many threads miss together. Entries expire after `ttl` seconds so
+    collections deleted by another process are eventually re-resolved; deletes
+    made through this worker call `invalidate` immediately, and `refresh` swaps
+    a handle that Chroma reported as missing for a fresh one.
+    """
+
+    def __init__(self, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: Dict[str, tuple] = {}  # name -> (handle, expires_at, factory)
+        self._lock = threading.Lock()
+        self._name_locks: Dict[str, threading.Lock] = {}
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, name: str, factory: Callable[[], Any]) -> Any:
+        handle = self._lookup(name)
+        if handle is not None:
+            return handle
+        with self._name_lock(name):
+            # Another thread may have resolved it while we waited
+            handle = self._lookup(name)
+            if handle is not None:
+                return handle
+            handle = factory()
+            with self._lock:
+                self.stats["misses"] += 1
+                if self.ttl > 0:
+                    self._entries[name] = (handle, self.clock() + self.ttl, factory)
+            return handle
+
+    def refresh(self, name: str) -> Optional[Any]:
+        """Drop `name` and resolve it again with its last factory (None if never cached)."""
+        with self._lock:
+            entry = self._entries.get(name)
+        if not entry:
+            return None
+        self.invalidate(name)
+        return self.get(name, entry[2])
+
+    def invalidate(self, name: Optional[str] = None):
+        """Forget one collection, or all of them."""
+        with self._lock:
+            if name is None:
+                self.stats["invalidations"] += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(name, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), ttl_seconds=self.ttl)
+
+    def _lookup(self, name: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            if entry[1] <= self.clock():
+                del self._entries[name]
+                return None
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def _name_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._name_locks.setdefault(name, threading.Lock())
+
+
+def is_missing_collection_error(error: Exception) -> bool:
+    """True when Chroma rejected a call because the collection no longer exists
+    (the exception type differs between chromadb versions)."""
+    text = f"{type(error).__name__}: {error}".lower()
+    return "notfound" in text.replace(" ", "") or "does not exist" in text
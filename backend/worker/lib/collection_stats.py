@@ -0,0 +1,136 @@
+# worker/lib/collection_stats.py
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionStatsService:
+    """
+    Collection statistics refreshed in the background and served from memory.
+
+    Every `interval` seconds each collection matching `prefix` is counted; when
+    its count changed since the last refresh (or on a forced refresh) its
+    metadatas are paged through once to rebuild the per-access_level and
+    per-filename breakdowns. Callers on the search path read `get(name)` and
+    never touch Chroma.
+    """
+
+    def __init__(self,
+                 client_provider: Callable[[], Any],
+                 interval: float = 300.0,
+                 prefix: str = "privacy_documents",
+                 page_size: int = 5000,
+                 top_filenames: int = 50):
+        self.client_provider = client_provider
+        self.interval = interval
+        self.prefix = prefix
+        self.page_size = page_size
+        self.top_filenames = top_filenames
+        self.last_refresh: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, name="collection-stats", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._stats.get(name)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            collections = dict(self._stats)
+        return {
+            "collections": collections,
+            "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None,
+            "refresh_interval_seconds": self.interval,
+            "last_error": self.last_error,
+        }
+
+    def forget(self, name: str):
+        with self._lock:
+            self._stats.pop(name, None)
+
+    def refresh(self, force: bool = False, names: Optional[List[str]] = None):
+        """Recount collections now (all of them, or `names`)."""
+        with self._refresh_lock:
+            client = self.client_provider()
+            if names is None:
+                names = [n for n in self._list_names(client) if n.startswith(self.prefix)]
+                with self._lock:
+                    for gone in set(self._stats) - set(names):
+                        del self._stats[gone]
+            for name in names:
+                try:
+                    self._refresh_one(client, name, force)
+                except Exception as e:
+                    logger.warning("[CollectionStats] Refresh of '%s' failed: %s", name, e)
+            self.last_refresh = datetime.now()
+
+    def _refresh_one(self, client, name: str, force: bool):
+        started = time.perf_counter()
+        collection = client.get_collection(name)
+        total = collection.count()
+        previous = self.get(name)
+        if previous and previous["total"] == total and not force:
+            with self._lock:
+                self._stats[name] = dict(previous, counted_at=datetime.now().isoformat())
+            return
+
+        by_access: Dict[str, int] = {}
+        by_filename: Dict[str, int] = {}
+        offset = 0
+        while offset < total:
+            page = collection.get(include=["metadatas"], limit=self.page_size, offset=offset)
+            metadatas = page.get("metadatas") or []
+            if not metadatas:
+                break
+            for meta in metadatas:
+                meta = meta or {}
+                access = str(meta.get("access_level") or "unknown")
+                by_access[access] = by_access.get(access, 0) + 1
+                filename = str(meta.get("filename") or "unknown")
+                by_filename[filename] = by_filename.get(filename, 0) + 1
+            offset += len(metadatas)
+
+        top = sorted(by_filename.items(), key=lambda kv: kv[1], reverse=True)[:self.top_filenames]
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._stats[name] = {
+                "name": name,
+                "total": total,
+                "by_access_level": by_access,
+                "by_filename": dict(top),
+                "distinct_filenames": len(by_filename),
+                "counted_at": now,
+                "scanned_at": now,
+                "scan_ms": round((time.perf_counter() - started) * 1000, 1),
+            }
+
+    def _list_names(self, client) -> List[str]:
+        # chromadb < 0.6 returns Collection objects, newer versions return names
+        return [c if isinstance(c, str) else c.name for c in client.list_collections()]
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("[CollectionStats] Refresh failed: %s", e)
+            self._stopped.wait(self.interval)
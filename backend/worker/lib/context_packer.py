@@ -0,0 +1,201 @@
+# worker/lib/context_packer.py
+"""
+Token-budgeted context assembly for /chat.
+
+Retrieved chunks are picked by maximal marginal relevance: each step takes the
+chunk with the best  lambda * relevance - (1 - lambda) * max similarity to the
+chunks already picked, so a second copy of the same passage loses to a
+different record. Before a chunk is added:
+
+  - it is dropped when it is a near-duplicate (cosine >= duplicate_threshold)
+    of a picked chunk naming the same entity IDs; records of different
+    students embed almost identically and are never treated as duplicates
+  - text it shares with a neighbouring picked chunk (the splitter's chunk
+    overlap) is trimmed
+  - it is skipped when it no longer fits the token budget (smaller chunks
+    further down may still fit)
+
+Relevance is the search score; similarity uses the chunk embeddings when
+available and word-set Jaccard otherwise.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from lib.blind_index import extract_entity_ids
+
+logger = logging.getLogger(__name__)
+
+RECORD_TEMPLATE = "DOCUMENT RECORD {n}:\n{text}\n---"
+RECORD_SEPARATOR = "\n\n"
+
+
+class PackedContext:
+    def __init__(self, text: str, chunk_ids: List[str], tokens_in: int, tokens_out: int, dropped: Dict[str, int],
+                 trimmed: int):
+        self.text = text
+        self.chunk_ids = chunk_ids
+        self.tokens_in = tokens_in
+        self.tokens_out = tokens_out
+        self.dropped = dropped
+        self.trimmed = trimmed
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+    def summary(self) -> str:
+        return (f"{len(self.chunk_ids)} records, {self.tokens_out}/{self.tokens_in} tokens "
+                f"(saved {self.tokens_saved}; dropped {self.dropped['duplicate']} duplicate, "
+                f"{self.dropped['budget']} over budget; trimmed {self.trimmed} overlaps)")
+
+
+class ContextPacker:
+
+    def __init__(self, encoding_name: str = "cl100k_base", mmr_lambda: float = 0.7,
+                 duplicate_threshold: float = 0.95, min_overlap_chars: int = 40):
+        self.encoding_name = encoding_name
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.min_overlap_chars = min_overlap_chars
+        self._encoding = None
+
+    def count_tokens(self, text: str) -> int:
+        encoding = self._get_encoding()
+        return len(encoding.encode(text)) if encoding else len(text) // 4 + 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        encoding = self._get_encoding()
+        if encoding is None:
+            return text[:max_tokens * 4]
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+
+    def pack(self, chunks: Sequence[Dict[str, Any]], budget: int,
+             embeddings: Optional[Dict[str, Sequence[float]]] = None) -> PackedContext:
+        """Select from `chunks` ({"id", "text", "score"}, best first) within `budget` tokens."""
+        chunks = [c for c in chunks if c.get("text")]
+        tokens_in = self.count_tokens(RECORD_SEPARATOR.join(
+            RECORD_TEMPLATE.format(n=i + 1, text=c["text"]) for i, c in enumerate(chunks)))
+        dropped = {"duplicate": 0, "budget": 0}
+        if not chunks:
+            return PackedContext("", [], tokens_in, 0, dropped, 0)
+
+        relevance = self._relevance([c.get("score") or 0.0 for c in chunks])
+        similarity = self._similarity(chunks, embeddings)
+        entities = [frozenset(extract_entity_ids(c["text"])) for c in chunks]
+
+        remaining = list(range(len(chunks)))
+        picked: List[int] = []
+        texts: List[str] = []
+        used = 0
+        trimmed = 0
+        separator_tokens = self.count_tokens(RECORD_SEPARATOR)
+        while remaining:
+            best = max(remaining, key=lambda i: self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * max(
+                (similarity[i, j] for j in picked), default=0.0))
+            remaining.remove(best)
+
+            if any(similarity[best, j] >= self.duplicate_threshold and entities[best] == entities[j] for j in picked):
+                dropped["duplicate"] += 1
+                continue
+            text = chunks[best]["text"]
+            stripped = self._strip_overlap(text, texts)
+            if not stripped.strip():
+                dropped["duplicate"] += 1
+                continue
+            trimmed += stripped != text
+
+            record = RECORD_TEMPLATE.format(n=len(picked) + 1, text=stripped)
+            cost = self.count_tokens(record) + (separator_tokens if picked else 0)
+            if used + cost > budget:
+                if picked:
+                    dropped["budget"] += 1
+                    continue
+                # The most relevant chunk alone exceeds the budget: keep its head
+                overhead = self.count_tokens(RECORD_TEMPLATE.format(n=1, text=""))
+                stripped = self.truncate(stripped, max(budget - overhead, 0))
+                record = RECORD_TEMPLATE.format(n=1, text=stripped)
+                cost = self.count_tokens(record)
+            picked.append(best)
+            texts.append(stripped)
+            used += cost
+
+        text = RECORD_SEPARATOR.join(RECORD_TEMPLATE.format(n=i + 1, text=t) for i, t in enumerate(texts))
+        return PackedContext(text, [chunks[i]["id"] for i in picked], tokens_in, self.count_tokens(text), dropped,
+                             trimmed)
+
+    def _get_encoding(self):
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.warning("tiktoken encoding %s unavailable (%s); estimating 4 chars per token",
+                               self.encoding_name, e)
+                self._encoding = False
+        return self._encoding or None
+
+    @staticmethod
+    def _relevance(scores: List[float]) -> np.ndarray:
+        values = np.asarray(scores, dtype=np.float64)
+        spread = values.max() - values.min()
+        return (values - values.min()) / spread if spread > 0 else np.ones_like(values)
+
+    @staticmethod
+    def _similarity(chunks: Sequence[Dict[str, Any]], embeddings: Optional[Dict[str, Sequence[float]]]) -> np.ndarray:
+        if embeddings and all(embeddings.get(c["id"]) is not None for c in chunks):
+            vectors = np.asarray([embeddings[c["id"]] for c in chunks], dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+            return vectors @ vectors.T
+        words = [set(c["text"].lower().split()) for c in chunks]
+        similarity = np.zeros((len(chunks), len(chunks)))
+        for i in range(len(chunks)):
+            for j in range(i, len(chunks)):
+                union = len(words[i] | words[j])
+                similarity[i, j] = similarity[j, i] = len(words[i] & words[j]) / union if union else 1.0
+        return similarity
+
+    def _strip_overlap(self, text: str, picked: Sequence[str]) -> str:
+        """Remove a prefix (or suffix) of `text` that repeats the tail (or head) of a picked chunk."""
+        probe = self.min_overlap_chars
+        if len(text) < probe:
+            return text
+        for other in picked:
+            if text in other:
+                return ""
+            # tail of `other` == head of `text`
+            start = other.find(text[:probe])
+            while start != -1:
+                if text.startswith(other[start:]):
+                    text = text[len(other) - start:]
+                    break
+                start = other.find(text[:probe], start + 1)
+            if len(text) < probe:
+                continue
+            # tail of `text` == head of `other`
+            end = text.find(other[:probe])
+            while end != -1:
+                if other.startswith(text[end:]):
+                    text = text[:end]
+                    break
+                end = text.find(other[:probe], end + 1)
+        return text
+
+
+def parse_token_budgets(raw: Optional[str]) -> Dict[str, int]:
+    """Parse "model=tokens" pairs such as "phi3:mini=1200,gpt-4o-mini=6000" into a dict."""
+    budgets = {}
+    if not raw:
+        return budgets
+    for part in raw.split(","):
+        if "=" not in part:
+            continue
+        model, tokens = part.rsplit("=", 1)
+        try:
+            budgets[model.strip()] = int(tokens.strip())
+        except ValueError:
+            logger.warning("Ignoring malformed context token budget '%s'", part)
+    return budgets
@@ -0,0 +1,301 @@
+# worker/lib/embedding_client.py
+import time
+import random
+import logging
+import threading
+import statistics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Any
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackendOverloaded(Exception):
+    """Raised by the transport when the backend timed out, refused or returned 429/502/503/504."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker is open and calls are being shed."""
+
+
+class EmbeddingBusyError(CircuitOpenError):
+    """Raised when an interactive call finds no free slot within its wait; shed like an open circuit."""
+
+
+class AIMDLimiter:
+    """
+    Additive-increase / multiplicative-decrease limit on in-flight requests.
+
+    Every successful call grows the limit by 1/limit (about +1 per round trip)
+    while the limiter is actually in use; an overload signal (timeout, refusal,
+    429/5xx) or a latency excursion cuts it by `backoff_ratio`, at most once per
+    `cooldown` so one burst of slow responses counts as a single congestion event.
+
+    A latency excursion is the median of the last `recent` calls exceeding
+    `latency_tolerance` x the baseline, a slow EWMA of the median over the last
+    `window` calls. Chunk sizes vary a lot (CSV rows vs 512-token PDF chunks),
+    so neither a single slow call nor the fastest call ever seen is a
+    meaningful reference.
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 16,
+                 backoff_ratio: float = 0.5, latency_tolerance: float = 2.0, cooldown: float = 1.0,
+                 window: int = 100, recent: int = 10):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._baseline: Optional[float] = None
+        self._latencies = deque(maxlen=max(window, recent))
+        self._recent = max(1, recent)
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def baseline(self) -> Optional[float]:
+        return self._baseline
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._in_flight < self.limit, timeout=timeout):
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, latency: Optional[float], success: bool, overloaded: bool = False):
+        with self._cond:
+            busy = self._in_flight >= self.limit / 2.0
+            self._in_flight -= 1
+            if overloaded:
+                self._decrease()
+            elif success and latency is not None:
+                self._observe(latency)
+                if self._baseline is not None and self._recent_median() > self.latency_tolerance * self._baseline:
+                    self._decrease()
+                elif busy and self._limit < self.max_limit:
+                    self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                    self.increases += 1
+            self._cond.notify_all()
+
+    def _observe(self, latency: float):
+        self._latencies.append(latency)
+        if len(self._latencies) < self._recent:
+            return
+        median = statistics.median(self._latencies)
+        # Slow enough that sustained congestion still stands out against it; a
+        # permanently slower backend (bigger model, colder cache) is absorbed
+        self._baseline = median if self._baseline is None else self._baseline + 0.05 * (median - self._baseline)
+
+    def _recent_median(self) -> float:
+        return statistics.median(list(self._latencies)[-self._recent:])
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+        self.decreases += 1
+        if self.limit != previous:
+            logger.info("[Embeddings] Concurrency limit %d -> %d", previous, self.limit)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive overload failures; after
+    `reset_timeout` a single probe is let through (half-open) to test recovery."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 15.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("[Embeddings] Circuit closed: backend recovered")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                logger.warning("[Embeddings] Circuit OPEN after %d consecutive failures; shedding calls for %.0fs",
+                               self.consecutive_failures, self.reset_timeout)
+
+    def seconds_until_probe(self) -> float:
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+
+class EmbeddingClient:
+    """
+    Embedding calls behind an AIMD concurrency limiter and a circuit breaker.
+
+    `transport(text, timeout)` performs one backend call and returns the vector,
+    None when the backend answered without a usable embedding, or raises
+    EmbeddingBackendOverloaded. Overloads are retried with jittered exponential
+    backoff; once the breaker opens, calls fail fast with CircuitOpenError until a
+    probe succeeds, so callers can defer work instead of queueing into timeouts.
+
+    Interactive calls (search / chat query embeddings) go through their own
+    `query_limiter`, so they never queue behind bulk ingestion saturating the
+    main limit, and wait at most `query_wait` seconds for a slot before failing
+    with EmbeddingBusyError.
+    """
+
+    def __init__(self, transport: Callable[[str, float], Optional[List[float]]],
+                 limiter: Optional[AIMDLimiter] = None,
+                 query_limiter: Optional[AIMDLimiter] = None,
+                 breaker: Optional[CircuitBreaker] = None,
+                 timeout: float = 20.0,
+                 max_attempts: int = 3,
+                 backoff_base: float = 0.25,
+                 backoff_cap: float = 4.0,
+                 query_wait: float = 2.0):
+        self.transport = transport
+        self.limiter = limiter or AIMDLimiter()
+        self.query_limiter = query_limiter or AIMDLimiter(initial=2, max_limit=4)
+        self.query_wait = query_wait
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._executor = ThreadPoolExecutor(max_workers=self.limiter.max_limit, thread_name_prefix="embed")
+        self._query_executor = ThreadPoolExecutor(max_workers=self.query_limiter.max_limit,
+                                                  thread_name_prefix="embed-query")
+        self._lock = threading.Lock()
+        self._latency_ewma: Optional[float] = None
+        self.counters = {"calls": 0, "succeeded": 0, "empty": 0, "overloaded": 0,
+                         "retries": 0, "rejected_open": 0, "rejected_busy": 0}
+
+    def embed(self, text: str, interactive: bool = False) -> Optional[List[float]]:
+        limiter = self.query_limiter if interactive else self.limiter
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self._count("retries")
+                time.sleep(min(self.backoff_cap, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0))
+            # Wait for a concurrency slot first; calls are bounded by `timeout`, so
+            # slots always free up. The breaker is consulted once we hold one.
+            if not limiter.acquire(timeout=self.query_wait if interactive else None):
+                self._count("rejected_busy")
+                raise EmbeddingBusyError(f"no embedding slot free within {self.query_wait:.1f}s")
+            if not self.breaker.allow():
+                limiter.release(None, success=False)
+                self._count("rejected_open")
+                raise CircuitOpenError(f"embedding backend circuit open (retry in {self.breaker.seconds_until_probe():.0f}s)")
+            self._count("calls")
+            started = time.perf_counter()
+            try:
+                embedding = self.transport(text, self.timeout)
+            except Exception as e:
+                # Timeouts, refused connections, 429/5xx (and unexpected transport errors)
+                limiter.release(time.perf_counter() - started, success=False, overloaded=True)
+                self.breaker.record_failure()
+                self._count("overloaded")
+                logger.debug("[Embeddings] Backend call failed (attempt %d/%d): %s", attempt + 1, self.max_attempts, e)
+                continue
+            latency = time.perf_counter() - started
+            limiter.release(latency, success=True)
+            self.breaker.record_success()
+            self._observe(latency)
+            if not embedding:
+                self._count("empty")
+                return None
+            self._count("succeeded")
+            return embedding
+        return None
+
+    def embed_many(self, texts: Sequence[str], interactive: bool = False) -> List[Optional[List[float]]]:
+        """Embed texts concurrently (bounded by the limiter). Raises CircuitOpenError
+        if the breaker opened (or, interactive, no slot freed up) while the batch was in flight."""
+        if len(texts) <= 1:
+            return [self.embed(t, interactive) for t in texts]
+        executor = self._query_executor if interactive else self._executor
+        futures = [executor.submit(self.embed, t, interactive) for t in texts]
+        results: List[Optional[List[float]]] = []
+        circuit_error = None
+        for future in futures:
+            try:
+                results.append(future.result())
+            except CircuitOpenError as e:
+                circuit_error = e
+                results.append(None)
+        if circuit_error:
+            raise circuit_error
+        return results
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            ewma = self._latency_ewma
+        baseline = self.limiter.baseline
+        return {
+            "concurrency_limit": self.limiter.limit,
+            "in_flight": self.limiter.in_flight,
+            "min_limit": self.limiter.min_limit,
+            "max_limit": self.limiter.max_limit,
+            "limit_increases": self.limiter.increases,
+            "limit_decreases": self.limiter.decreases,
+            "query_concurrency_limit": self.query_limiter.limit,
+            "query_in_flight": self.query_limiter.in_flight,
+            "latency_ewma_ms": round(ewma * 1000, 1) if ewma is not None else None,
+            "latency_baseline_ms": round(baseline * 1000, 1) if baseline is not None else None,
+            "circuit_state": self.breaker.state,
+            "circuit_times_opened": self.breaker.times_opened,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            **counters,
+        }
+
+    def _observe(self, latency: float):
+        with self._lock:
+            self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counters[key] += 1
@@ -0,0 +1,233 @@
+# worker/lib/rbac_partitions.py
+"""
+RBAC-partitioned copies of an org collection.
+
+With RBAC_PARTITIONS enabled, every chunk written to an org collection
+(privacy_documents_<org>) is also written to the small partitions a restricted
+role can read:
+
+    <base>__al_student        access_level == student
+    <base>__al_general        access_level == general
+    <base>__user_<id>         access_level == general, uploaded_by == <id>
+
+Student and general-role searches query only those partitions and merge the
+hits by distance, instead of running a filtered HNSW search over the whole org
+(where a small allowed subset makes the filter expensive and recall poor).
+Faculty and admins keep using the full collection. A base collection is only
+routed to its partitions once a backfill has copied its existing chunks
+(PartitionRegistry), so enabling the layout never hides data.
+"""
+import re
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+PARTITION_SEPARATOR = "__"
+PARTITIONED_ACCESS_LEVELS = ("student", "general")
+# Exact partition suffixes: org collections named after an org ("St. John's" ->
+# privacy_documents_st__john_s) may contain the separator themselves
+PARTITION_RE = re.compile(r"^(?P<base>.+)" + PARTITION_SEPARATOR
+                          + r"(?:al_(?:" + "|".join(PARTITIONED_ACCESS_LEVELS) + r")|user_\d+)$")
+
+
+def partition_name(base: str, access_level: Optional[str] = None, user_id: Optional[Any] = None) -> str:
+    if user_id is not None:
+        return f"{base}{PARTITION_SEPARATOR}user_{int(user_id)}"
+    return f"{base}{PARTITION_SEPARATOR}al_{access_level}"
+
+
+def partition_base(name: str) -> Optional[str]:
+    """Base collection of a partition name; None for anything else."""
+    match = PARTITION_RE.match(name)
+    return match.group("base") if match else None
+
+
+def is_partition(name: str) -> bool:
+    return partition_base(name) is not None
+
+
+def partitions_for_chunk(base: str, metadata: Optional[Dict[str, Any]]) -> List[str]:
+    """Partitions a chunk with this metadata belongs to (besides the base collection)."""
+    metadata = metadata or {}
+    access_level = metadata.get("access_level")
+    names = []
+    if access_level in PARTITIONED_ACCESS_LEVELS:
+        names.append(partition_name(base, access_level))
+    uploaded_by = metadata.get("uploaded_by")
+    if access_level == "general" and uploaded_by not in (None, ""):
+        try:
+            names.append(partition_name(base, user_id=uploaded_by))
+        except (TypeError, ValueError):
+            pass
+    return names
+
+
+def partitions_for_role(base: str, role: Optional[str], user_id: Optional[Any] = None) -> Optional[List[str]]:
+    """Smallest partition set covering what `role` may read, or None when the
+    role is served from the full collection (faculty, admins, unknown roles)."""
+    if role == "student":
+        return [partition_name(base, "student"), partition_name(base, "general")]
+    if role == "general":
+        if user_id not in (None, ""):
+            try:
+                return [partition_name(base, user_id=user_id)]
+            except (TypeError, ValueError):
+                return None
+        return [partition_name(base, "general")]
+    return None
+
+
+def merge_query_results(results: Sequence[Optional[Dict[str, Any]]], n_results: int) -> Dict[str, Any]:
+    """Merge single-query Chroma results from several collections by ascending distance."""
+    hits = []
+    for result in results:
+        if not result or not result.get("ids") or not result["ids"][0]:
+            continue
+        ids = result["ids"][0]
+        documents = (result.get("documents") or [[None] * len(ids)])[0]
+        metadatas = (result.get("metadatas") or [[None] * len(ids)])[0]
+        distances = (result.get("distances") or [[0.0] * len(ids)])[0]
+        hits.extend(zip(distances, ids, documents, metadatas))
+    hits.sort(key=lambda hit: hit[0])
+    seen = set()
+    merged = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+    for distance, item_id, document, metadata in hits:
+        if item_id in seen:
+            continue
+        seen.add(item_id)
+        merged["ids"][0].append(item_id)
+        merged["documents"][0].append(document)
+        merged["metadatas"][0].append(metadata)
+        merged["distances"][0].append(distance)
+        if len(seen) >= n_results:
+            break
+    return merged
+
+
+def merge_get_results(results: Sequence[Optional[Dict[str, Any]]], limit: int) -> Dict[str, Any]:
+    """Concatenate Chroma get() results (ids, documents, metadatas) up to `limit`."""
+    merged = {"ids": [], "documents": [], "metadatas": []}
+    seen = set()
+    for result in results:
+        if not result:
+            continue
+        ids = result.get("ids") or []
+        documents = result.get("documents") or [None] * len(ids)
+        metadatas = result.get("metadatas") or [None] * len(ids)
+        for item_id, document, metadata in zip(ids, documents, metadatas):
+            if item_id in seen or len(merged["ids"]) >= limit:
+                continue
+            seen.add(item_id)
+            merged["ids"].append(item_id)
+            merged["documents"].append(document)
+            merged["metadatas"].append(metadata)
+    return merged
+
+
+class PartitionRegistry:
+    """
+    Which base collections have complete partitions (table vector_partitions).
+    Readiness is cached for `ttl` seconds so the search path does not hit
+    Postgres; a base is marked ready by the backfill that copied its chunks.
+    """
+
+    def __init__(self, get_conn: Callable[[], Any], put_conn: Callable[[Any], None], ttl: float = 60.0):
+        self.get_conn = get_conn
+        self.put_conn = put_conn
+        self.ttl = ttl
+        self._ready: set = set()
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_ready(self, base: str) -> bool:
+        if time.monotonic() - self._loaded_at > self.ttl:
+            self._load()
+        with self._lock:
+            return base in self._ready
+
+    def ready(self) -> List[str]:
+        self._load()
+        with self._lock:
+            return sorted(self._ready)
+
+    def mark_ready(self, base: str, chunks: int):
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO vector_partitions (base_collection, chunks_copied, ready_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (base_collection)
+                    DO UPDATE SET chunks_copied = EXCLUDED.chunks_copied, ready_at = NOW()
+                """, (base, chunks))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
+        with self._lock:
+            self._ready.add(base)
+
+    def forget(self, base: str):
+        conn = self.get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM vector_partitions WHERE base_collection = %s", (base,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.put_conn(conn)
+        with self._lock:
+            self._ready.discard(base)
+
+    def _load(self):
+        conn = None
+        try:
+            conn = self.get_conn()
+            with conn.cursor() as cur:
+                cur.execute("SELECT base_collection FROM vector_partitions WHERE ready_at IS NOT NULL")
+                ready = {row[0] for row in cur.fetchall()}
+            conn.commit()
+            with self._lock:
+                self._ready = ready
+        except Exception as e:
+            logger.warning("[Partitions] Could not load partition registry: %s", e)
+        finally:
+            self._loaded_at = time.monotonic()
+            if conn:
+                self.put_conn(conn)
+
+
+def backfill_partitions(base_collection, write_partition: Callable[[str, List[str], List[Any], List[str], List[Dict]], None],
+                        page_size: int = 1000) -> int:
+    """Copy the existing chunks of `base_collection` into their partitions.
+    `write_partition(name, ids, embeddings, documents, metadatas)` upserts one
+    group. Returns the number of chunks copied."""
+    copied = 0
+    offset = 0
+    while True:
+        page = base_collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        ids = page.get("ids") or []
+        if not ids:
+            break
+        embeddings = page.get("embeddings")
+        documents = page.get("documents") or [None] * len(ids)
+        metadatas = page.get("metadatas") or [None] * len(ids)
+        groups: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            for name in partitions_for_chunk(base_collection.name, metadata):
+                groups.setdefault(name, []).append(i)
+        for name, idx in groups.items():
+            # Newer chromadb returns numpy rows; add() wants plain lists
+            write_partition(name, [ids[i] for i in idx],
+                            [embeddings[i].tolist() if hasattr(embeddings[i], "tolist") else embeddings[i] for i in idx],
+                            [documents[i] for i in idx], [metadatas[i] for i in idx])
+            copied += len(idx)
+        offset += len(ids)
+    return copied
@@ -0,0 +1,96 @@
+# worker/lib/result_cache.py
+"""
+Search result cache invalidated by a per-collection index version.
+
+Every write to an org collection (ingest, delete, retention purge) INCRs
+index_version:<collection>; entries are stored under the version current when
+the search started, so a reindex makes all older entries unreachable at once
+(they then age out via TTL). Version lookup and entry fetch happen in one
+Redis script call.
+"""
+import json
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "index_version:{collection}"
+ENTRY_PREFIX = "search_cache:{collection}:"
+
+# KEYS[1] = version key; ARGV = entry key prefix, digest. Returns {version, entry or ''}
+GET_SCRIPT = """
+local version = redis.call('GET', KEYS[1]) or '0'
+-- '' rather than nil: a nil would truncate the returned array
+return {version, redis.call('GET', ARGV[1] .. version .. ':' .. ARGV[2]) or ''}
+"""
+
+
+def normalize_query(query: Optional[str]) -> str:
+    return " ".join((query or "").split()).casefold()
+
+
+class SearchResultCache:
+    """Versioned cache of pre-DP search results, shared by all workers through Redis."""
+
+    def __init__(self, redis_provider: Callable[[], Any], ttl: int = 600, enabled: bool = True):
+        self.redis_provider = redis_provider
+        self.ttl = ttl
+        self.enabled = enabled
+        self._get_script = None
+        self.stats = {"hits": 0, "misses": 0, "errors": 0}
+
+    def key(self, role: Optional[str], user_id: Optional[Any], query: str,
+            top_k: int, dp_enabled: bool) -> str:
+        # user_id only narrows results for roles filtered or partitioned by uploader
+        scope_user = user_id if role == "general" else None
+        raw = json.dumps([role, scope_user, normalize_query(query), top_k, bool(dp_enabled)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, collection: str, digest: str) -> Optional[tuple]:
+        """(version, entry) where entry is None on a miss; None when the cache is unavailable."""
+        if not self.enabled:
+            return None
+        try:
+            client = self.redis_provider()
+            if self._get_script is None:
+                self._get_script = client.register_script(GET_SCRIPT)
+            version, raw = self._get_script(
+                keys=[VERSION_KEY.format(collection=collection)],
+                args=[ENTRY_PREFIX.format(collection=collection), digest],
+                client=client,
+            )
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.debug("Search cache lookup failed: %s", e)
+            return None
+        version = version.decode() if isinstance(version, bytes) else str(version)
+        if raw:
+            self.stats["hits"] += 1
+            return version, json.loads(raw)
+        self.stats["misses"] += 1
+        return version, None
+
+    def put(self, collection: str, version: str, digest: str, entry: Dict[str, Any]):
+        if not self.enabled or version is None:
+            return
+        try:
+            self.redis_provider().set(f"{ENTRY_PREFIX.format(collection=collection)}{version}:{digest}",
+                                      json.dumps(entry), ex=self.ttl)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.debug("Search cache store failed: %s", e)
+
+    def bump(self, collection: str):
+        """Invalidate every cached result of `collection`."""
+        if not self.enabled:
+            return
+        try:
+            self.redis_provider().incr(VERSION_KEY.format(collection=collection))
+        except Exception as e:
+            # A missed bump could serve stale results; make it loud
+            self.stats["errors"] += 1
+            logger.error("Could not bump index version of %s: %s", collection, e)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats, enabled=self.enabled, ttl_seconds=self.ttl)
@@ -0,0 +1,159 @@
+# worker/lib/semantic_cache.py
+"""
+Near-duplicate query cache in front of the Chroma vector query.
+
+Recent query embeddings are kept per scope (target collection / partitions,
+RBAC filter, result count and index version). A new query whose embedding has
+cosine similarity >= threshold with a cached one, and that names exactly the
+same entity IDs, reuses that query's vector candidates; lexical fusion, the
+exact-ID lookup, scoring and DP still run for the actual query. Scopes are
+small (`capacity` rows), so the nearest neighbour is one matrix-vector product.
+
+The index version comes from the search result cache (Redis), so that writes
+from any worker invalidate cached candidates. Without it (result cache
+disabled, Redis unreachable) nothing is cached; such lookups are counted as
+"unversioned" instead of being served possibly stale results.
+"""
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Upper edges of the best-similarity histogram used to tune the threshold
+SIMILARITY_BUCKETS = (0.80, 0.85, 0.90, 0.93, 0.95, 0.97, 0.98, 0.99, 1.0)
+
+
+class _Scope:
+    """Ring buffer whose storage doubles up to `capacity` rows, so quiet scopes stay small."""
+
+    def __init__(self, dim: int, capacity: int):
+        self.capacity = capacity
+        self.vectors = np.zeros((min(16, capacity), dim), dtype=np.float32)
+        self.entries: List[tuple] = []  # (entity_ids, results, stored_at) per row
+        self.next = 0
+        self.size = 0
+
+    def add(self, vector: np.ndarray, entry: tuple):
+        if self.size < self.capacity:
+            if self.size == self.vectors.shape[0]:
+                grown = np.zeros((min(self.size * 2, self.capacity), self.vectors.shape[1]), dtype=np.float32)
+                grown[:self.size] = self.vectors
+                self.vectors = grown
+            self.vectors[self.size] = vector
+            self.entries.append(entry)
+            self.size += 1
+            return
+        self.vectors[self.next] = vector
+        self.entries[self.next] = entry
+        self.next = (self.next + 1) % self.capacity
+
+
+class SemanticQueryCache:
+    """Per-scope ring buffers of normalised query embeddings and their vector results."""
+
+    def __init__(self, threshold: float = 0.97, capacity: int = 256, ttl: float = 300.0,
+                 max_scopes: int = 128, enabled: bool = True):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_scopes = max_scopes
+        self.enabled = enabled
+        self._scopes: "OrderedDict[Hashable, _Scope]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "entity_mismatches": 0, "expired": 0,
+                      "unversioned": 0}
+        self._unversioned_logged = False
+        self.histogram = {str(edge): 0 for edge in SIMILARITY_BUCKETS}
+
+    def get(self, scope: Hashable, embedding: Sequence[float], entity_ids: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """A copy of the cached results of the nearest query in `scope`, if close enough."""
+        if not self.enabled:
+            return None
+        query = self._normalise(embedding)
+        with self._lock:
+            self.stats["lookups"] += 1
+            entry = self._scopes.get(scope)
+            if entry is None or entry.size == 0 or entry.vectors.shape[1] != query.shape[0]:
+                self.stats["misses"] += 1
+                return None
+            self._scopes.move_to_end(scope)
+            similarities = entry.vectors[:entry.size] @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            self._record_similarity(similarity)
+            cached_ids, results, stored_at = entry.entries[best]
+            if similarity < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            if time.monotonic() - stored_at > self.ttl:
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            if cached_ids != frozenset(entity_ids):
+                # "GPA of STU1001" and "GPA of STU1002" embed almost identically
+                self.stats["entity_mismatches"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return copy.deepcopy(results)
+
+    def skip_unversioned(self):
+        """Count a lookup skipped because no index version was known; warns once per outage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.stats["unversioned"] += 1
+            if self._unversioned_logged:
+                return
+            self._unversioned_logged = True
+        logger.warning("[SemanticCache] No index version from the result cache (disabled or Redis "
+                       "unreachable); near-duplicate queries are not cached until it is back")
+
+    def put(self, scope: Hashable, embedding: Sequence[float], entity_ids: Sequence[str], results: Dict[str, Any]):
+        if not self.enabled or not results:
+            return
+        query = self._normalise(embedding)
+        with self._lock:
+            self._unversioned_logged = False
+            entry = self._scopes.get(scope)
+            if entry is None or entry.vectors.shape[1] != query.shape[0]:
+                entry = self._scopes[scope] = _Scope(query.shape[0], self.capacity)
+                while len(self._scopes) > self.max_scopes:
+                    self._scopes.popitem(last=False)
+            self._scopes.move_to_end(scope)
+            entry.add(query, (frozenset(entity_ids), copy.deepcopy(results), time.monotonic()))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["lookups"]
+            return dict(self.stats,
+                        hit_rate=round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                        threshold=self.threshold,
+                        scopes=len(self._scopes),
+                        entries=sum(scope.size for scope in self._scopes.values()),
+                        # Best similarity seen per lookup; shows what a lower threshold would add
+                        best_similarity_histogram=dict(self.histogram),
+                        enabled=self.enabled)
+
+    def clear(self):
+        with self._lock:
+            self._scopes.clear()
+
+    def _record_similarity(self, similarity: float):
+        for edge in SIMILARITY_BUCKETS:
+            if similarity <= edge:
+                self.histogram[str(edge)] += 1
+                return
+        self.histogram[str(SIMILARITY_BUCKETS[-1])] += 1
+
+    @staticmethod
+    def _normalise(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
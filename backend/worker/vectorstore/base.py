@@ -0,0 +1,71 @@
+# worker/vectorstore/base.py
+"""
+Vector store interface used by the worker.
+
+A VectorStore owns named collections; a VectorCollection stores chunks (id,
+embedding, document, metadata) and answers nearest-neighbour queries. Method
+names and arguments follow the Chroma collection API so call sites read the
+same whichever backend is configured (VECTOR_STORE_BACKEND).
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+Metadata = Dict[str, Any]
+Where = Optional[Dict[str, Any]]
+
+
+class VectorCollection(ABC):
+    name: str
+
+    @abstractmethod
+    def add(self, ids: List[str], embeddings: Optional[List[List[float]]] = None,
+            documents: Optional[List[str]] = None, metadatas: Optional[List[Metadata]] = None):
+        """Insert chunks; ids that already exist are left unchanged."""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: Optional[List[List[float]]] = None,
+               documents: Optional[List[str]] = None, metadatas: Optional[List[Metadata]] = None):
+        """Insert chunks, replacing existing ids."""
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, where: Where = None,
+              where_document: Where = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Nearest neighbours per query embedding: {"ids": [[...]], "distances": [[...]], ...}."""
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Where = None, where_document: Where = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Chunks by id and/or filter: {"ids": [...], "documents": [...], "metadatas": [...]}."""
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, where: Where = None):
+        """Remove chunks by id and/or metadata filter."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of chunks in the collection."""
+
+
+class VectorStore(ABC):
+    backend: str = ""
+
+    @abstractmethod
+    def get_or_create_collection(self, name: str, metadata: Optional[Metadata] = None) -> VectorCollection:
+        """Open a collection, creating it with `metadata` (index settings) when missing."""
+
+    @abstractmethod
+    def get_collection(self, name: str) -> VectorCollection:
+        """Open an existing collection; raises when it does not exist."""
+
+    @abstractmethod
+    def delete_collection(self, name: str):
+        """Drop a collection and all of its chunks."""
+
+    @abstractmethod
+    def list_collections(self) -> List[str]:
+        """Names of all collections."""
+
+    def heartbeat(self) -> bool:
+        """True when the backend is reachable."""
+        return True
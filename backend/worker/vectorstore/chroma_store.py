@@ -0,0 +1,110 @@
+# worker/vectorstore/chroma_store.py
+"""
+Chroma-backed VectorStore, over HTTP or embedded in the worker process.
+
+    http      chromadb.HttpClient against the Chroma server (default; every
+              call is an HTTP round trip with JSON-encoded vectors)
+    embedded  chromadb.PersistentClient on local disk: queries run in-process,
+              so single-node installs skip the network hop entirely. Only one
+              worker process may open the directory.
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+import chromadb
+
+from vectorstore.base import Metadata, VectorCollection, VectorStore, Where
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("http", "embedded")
+
+
+class ChromaCollection(VectorCollection):
+    """Thin adapter over a chromadb Collection (same arguments, same result shapes)."""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.name = collection.name
+
+    def add(self, ids: List[str], embeddings: Optional[List[List[float]]] = None,
+            documents: Optional[List[str]] = None, metadatas: Optional[List[Metadata]] = None):
+        self._collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids: List[str], embeddings: Optional[List[List[float]]] = None,
+               documents: Optional[List[str]] = None, metadatas: Optional[List[Metadata]] = None):
+        self._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, where: Where = None,
+              where_document: Where = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        kwargs = _present(where=where, where_document=where_document, include=include)
+        return self._collection.query(query_embeddings=query_embeddings, n_results=n_results, **kwargs)
+
+    def get(self, ids: Optional[List[str]] = None, where: Where = None, where_document: Where = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        kwargs = _present(ids=ids, where=where, where_document=where_document, limit=limit, offset=offset,
+                          include=include)
+        return self._collection.get(**kwargs)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Where = None):
+        self._collection.delete(**_present(ids=ids, where=where))
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    @property
+    def metadata(self) -> Optional[Metadata]:
+        return self._collection.metadata
+
+
+class ChromaVectorStore(VectorStore):
+
+    def __init__(self, client, backend: str):
+        self.client = client
+        self.backend = backend
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Metadata] = None) -> ChromaCollection:
+        return ChromaCollection(self.client.get_or_create_collection(name=name, **_present(metadata=metadata)))
+
+    def get_collection(self, name: str) -> ChromaCollection:
+        return ChromaCollection(self.client.get_collection(name))
+
+    def delete_collection(self, name: str):
+        self.client.delete_collection(name)
+
+    def list_collections(self) -> List[str]:
+        # chromadb < 0.6 returns Collection objects, newer versions return names
+        return [c if isinstance(c, str) else c.name for c in self.client.list_collections()]
+
+    def heartbeat(self) -> bool:
+        try:
+            self.client.heartbeat()
+            return True
+        except Exception:
+            return False
+
+
+def create_vector_store(backend: str, host: str = "chromadb", port: int = 8000, path: str = "/data/chroma",
+                        settings: Any = None) -> ChromaVectorStore:
+    """Build the VectorStore selected by VECTOR_STORE_BACKEND. `settings` are the
+    chromadb Settings for the HTTP client (connection pool)."""
+    if backend == "http":
+        client = chromadb.HttpClient(
+            host=host,
+            port=port,
+            tenant="default_tenant",
+            database="default_database",
+            **_present(settings=settings)
+        )
+    elif backend == "embedded":
+        client = chromadb.PersistentClient(path=path)
+        logger.info("Embedded vector store at %s", path)
+    else:
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{backend}' (choose from {', '.join(BACKENDS)})")
+    return ChromaVectorStore(client, backend)
+
+
+def _present(**kwargs) -> Dict[str, Any]:
+    """Drop unset arguments so each chromadb version applies its own defaults."""
+    return {k: v for k, v in kwargs.items() if v is not None}
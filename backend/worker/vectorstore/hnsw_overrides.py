@@ -0,0 +1,59 @@
+# worker/vectorstore/hnsw_overrides.py
+"""
+Per-collection HNSW settings (HNSW_OVERRIDES_PATH), written by
+benchmarks/hnsw_sweep.py:
+
+    {"privacy_documents_7": {"hnsw:M": 16, "hnsw:construction_ef": 128, "hnsw:search_ef": 64}}
+
+Chroma fixes HNSW parameters when a collection is created, so an override
+applies to collections created after it is written (e.g. after dropping and
+reindexing an org). RBAC partitions (<base>__...) inherit their base's entry.
+"""
+import os
+import json
+import logging
+from typing import Any, Dict
+
+from lib.rbac_partitions import partition_base
+
+logger = logging.getLogger(__name__)
+
+HNSW_KEYS = ("hnsw:M", "hnsw:construction_ef", "hnsw:search_ef", "hnsw:batch_size", "hnsw:sync_threshold")
+
+
+def load_overrides(path: str) -> Dict[str, Dict[str, Any]]:
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            raw = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error("Ignoring unreadable HNSW overrides %s: %s", path, e)
+        return {}
+    overrides = {}
+    for name, settings in raw.items():
+        unknown = set(settings) - set(HNSW_KEYS)
+        if unknown:
+            logger.warning("HNSW overrides for %s: ignoring %s", name, ", ".join(sorted(unknown)))
+        overrides[name] = {k: int(v) for k, v in settings.items() if k in HNSW_KEYS}
+    return overrides
+
+
+def collection_metadata(name: str, defaults: Dict[str, Any], overrides: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Creation metadata for `name`: the defaults with its (or its base collection's) override applied."""
+    settings = overrides.get(name) or overrides.get(partition_base(name) or name) or {}
+    return dict(defaults, **settings)
+
+
+def write_override(path: str, name: str, settings: Dict[str, Any]):
+    """Merge one collection's settings into the overrides file (atomic replace)."""
+    current = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            current = json.load(f)
+    current[name] = {k: v for k, v in settings.items() if k in HNSW_KEYS}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(current, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
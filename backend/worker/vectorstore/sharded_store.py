@@ -0,0 +1,367 @@
+# worker/vectorstore/sharded_store.py
+"""
+Spreads very large collections over several physical collections (VECTOR_SHARDS).
+
+A sharded collection privacy_documents_1 with 4 shards is stored as
+
+    privacy_documents_1.shard00 ... privacy_documents_1.shard03
+
+so each HNSW graph, rebuild, delete and sync_threshold flush covers a quarter
+of the org. Writes go to one shard, chosen by a stable hash of the chunk's
+document_id ("hash") or filename ("filename"); queries run on every shard in
+parallel and the per-shard top-k are merged by distance. Callers keep using
+the logical name: list_collections() reports it instead of the shard names.
+
+A collection that already existed unsharded stays readable (and deletable)
+as an extra shard after sharding is enabled; new chunks go to the shards.
+Changing a shard count likewise leaves old shards readable, but chunks are
+only rebalanced by reindexing the org. RBAC partitions (<base>__...) are not
+sharded: they are the small per-role copies and stay single collections.
+"""
+import time
+import zlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from vectorstore.base import Metadata, VectorCollection, VectorStore, Where
+
+logger = logging.getLogger(__name__)
+
+SHARD_SEPARATOR = ".shard"
+SHARD_KEYS = ("hash", "filename")
+# Result keys holding one list per query (query) or one entry per chunk (get)
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "embeddings")
+OP_COUNTERS = {"query": "queries", "write": "writes"}
+
+
+def shard_name(base: str, index: int) -> str:
+    return f"{base}{SHARD_SEPARATOR}{index:02d}"
+
+
+def is_shard(name: str) -> bool:
+    return SHARD_SEPARATOR in name
+
+
+def logical_name(name: str) -> str:
+    return name.split(SHARD_SEPARATOR, 1)[0]
+
+
+def parse_shard_counts(raw: Optional[str], prefix: str = "privacy_documents_") -> Dict[str, int]:
+    """Parse "org_id:shards" pairs such as "1:8,42:4" (or "collection_name:shards") into a dict."""
+    counts = {}
+    if not raw:
+        return counts
+    for part in raw.replace(";", ",").split(","):
+        if ":" not in part:
+            continue
+        key, count = part.rsplit(":", 1)
+        key = key.strip()
+        try:
+            counts[f"{prefix}{int(key)}" if key.isdigit() else key] = int(count.strip())
+        except ValueError:
+            logger.warning("Ignoring malformed shard count '%s'", part)
+    return {name: count for name, count in counts.items() if count > 1}
+
+
+def shard_for(metadata: Optional[Metadata], item_id: str, count: int, shard_key: str = "hash") -> int:
+    """Shard index of a chunk; stable across processes and restarts."""
+    metadata = metadata or {}
+    if shard_key == "filename":
+        key = metadata.get("filename") or metadata.get("document_id") or item_id
+    else:
+        key = metadata.get("document_id") or item_id
+    return zlib.crc32(str(key).encode("utf-8")) % count
+
+
+def merge_shard_queries(results: Sequence[Optional[Dict[str, Any]]], n_queries: int, n_results: int) -> Dict[str, Any]:
+    """Merge per-shard query() results into one result: per query, the n_results nearest hits."""
+    results = [r for r in results if r and r.get("ids")]
+    keys = [k for k in RESULT_KEYS if any(r.get(k) is not None for r in results)] or ["ids"]
+    merged: Dict[str, List[Any]] = {k: [] for k in keys}
+    for q in range(n_queries):
+        hits = []
+        for result in results:
+            distances = result.get("distances")
+            for j, item_id in enumerate(result["ids"][q]):
+                hits.append((distances[q][j] if distances is not None else 0.0, item_id, result, j))
+        hits.sort(key=lambda hit: hit[0])
+        chosen, seen = [], set()
+        for hit in hits:
+            if hit[1] in seen:
+                continue
+            seen.add(hit[1])
+            chosen.append(hit)
+            if len(chosen) >= n_results:
+                break
+        for k in keys:
+            merged[k].append([result[k][q][j] if result.get(k) is not None else None
+                              for _, _, result, j in chosen])
+    return merged
+
+
+def concat_shard_gets(results: Sequence[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Concatenate per-shard get() results in shard order."""
+    results = [r for r in results if r]
+    keys = [k for k in RESULT_KEYS if k != "distances" and any(r.get(k) is not None for r in results)] or ["ids"]
+    merged: Dict[str, List[Any]] = {k: [] for k in keys}
+    for result in results:
+        size = len(result.get("ids") or [])
+        for k in keys:
+            values = result.get(k)
+            merged[k].extend(list(values) if values is not None else [None] * size)
+    return merged
+
+
+class ShardStats:
+    """Per-shard call counters, kept by physical name so they survive handle refreshes."""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, op: str, elapsed_ms: float, error: bool = False):
+        with self._lock:
+            entry = self._stats.setdefault(name, {})
+            calls = OP_COUNTERS[op]
+            entry[calls] = entry.get(calls, 0) + 1
+            entry[f"{op}_ms_total"] = entry.get(f"{op}_ms_total", 0.0) + elapsed_ms
+            entry[f"{op}_ms_max"] = max(entry.get(f"{op}_ms_max", 0.0), elapsed_ms)
+            if error:
+                entry["errors"] = entry.get("errors", 0) + 1
+
+    def get(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = dict(self._stats.get(name, {}))
+        for op, counter in OP_COUNTERS.items():
+            calls = entry.get(counter)
+            if calls:
+                entry[f"{op}_ms_avg"] = round(entry[f"{op}_ms_total"] / calls, 2)
+                entry[f"{op}_ms_max"] = round(entry[f"{op}_ms_max"], 2)
+            entry.pop(f"{op}_ms_total", None)
+        return entry
+
+    def forget(self, names: Sequence[str]):
+        with self._lock:
+            for name in names:
+                self._stats.pop(name, None)
+
+
+class ShardedCollection(VectorCollection):
+    """
+    One logical collection over `shards`. The first `write_count` shards are
+    the configured ones and receive writes; any further shards (a previously
+    unsharded collection, shards left by a larger shard count) are read-only.
+    """
+
+    def __init__(self, name: str, shards: List[VectorCollection], write_count: int, shard_key: str,
+                 executor: ThreadPoolExecutor, stats: ShardStats):
+        self.name = name
+        self.shards = shards
+        self.write_count = write_count
+        self.shard_key = shard_key
+        self._executor = executor
+        self._stats = stats
+
+    def add(self, ids: List[str], embeddings: Optional[List[List[float]]] = None,
+            documents: Optional[List[str]] = None, metadatas: Optional[List[Metadata]] = None):
+        self._write("add", ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids: List[str], embeddings: Optional[List[List[float]]] = None,
+               documents: Optional[List[str]] = None, metadatas: Optional[List[Metadata]] = None):
+        self._write("upsert", ids, embeddings, documents, metadatas)
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, where: Where = None,
+              where_document: Where = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        results = self._scatter("query", lambda shard: shard.query(
+            query_embeddings=query_embeddings, n_results=n_results, where=where,
+            where_document=where_document, include=include))
+        return merge_shard_queries(results, len(query_embeddings), n_results)
+
+    def get(self, ids: Optional[List[str]] = None, where: Where = None, where_document: Where = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        if limit is None and not offset:
+            results = self._scatter("get", lambda shard: shard.get(
+                ids=ids, where=where, where_document=where_document, include=include))
+            return concat_shard_gets(results)
+        if ids is None and where is None and where_document is None:
+            return self._page(limit, offset or 0, include)
+        # Filtered page: the first offset+limit matches of the shard-ordered
+        # concatenation are within each shard's first offset+limit matches
+        window = (offset or 0) + limit if limit is not None else None
+        results = self._scatter("get", lambda shard: shard.get(
+            ids=ids, where=where, where_document=where_document, limit=window, include=include))
+        merged = concat_shard_gets(results)
+        end = (offset or 0) + limit if limit is not None else None
+        return {k: v[offset or 0:end] for k, v in merged.items()}
+
+    def delete(self, ids: Optional[List[str]] = None, where: Where = None):
+        self._scatter("write", lambda shard: shard.delete(ids=ids, where=where))
+
+    def count(self) -> int:
+        return sum(self._scatter("count", lambda shard: shard.count()))
+
+    @property
+    def metadata(self) -> Optional[Metadata]:
+        return getattr(self.shards[0], "metadata", None)
+
+    def shard_stats(self) -> List[Dict[str, Any]]:
+        counts = self._scatter("count", lambda shard: shard.count())
+        return [dict(name=shard.name, count=count, writable=i < self.write_count, **self._stats.get(shard.name))
+                for i, (shard, count) in enumerate(zip(self.shards, counts))]
+
+    def _write(self, method: str, ids, embeddings, documents, metadatas):
+        groups: Dict[int, List[int]] = {}
+        for i, item_id in enumerate(ids):
+            metadata = metadatas[i] if metadatas else None
+            groups.setdefault(shard_for(metadata, item_id, self.write_count, self.shard_key), []).append(i)
+
+        def pick(values, idx):
+            return [values[i] for i in idx] if values is not None else None
+
+        def call(shard_index: int):
+            idx = groups[shard_index]
+            shard = self.shards[shard_index]
+            getattr(shard, method)(ids=pick(ids, idx), embeddings=pick(embeddings, idx),
+                                   documents=pick(documents, idx), metadatas=pick(metadatas, idx))
+
+        self._run("write", [(self.shards[i], (lambda i=i: call(i))) for i in sorted(groups)])
+
+    def _page(self, limit: Optional[int], offset: int, include: Optional[List[str]]) -> Dict[str, Any]:
+        """Unfiltered paging through the shards in order, skipping whole shards by count."""
+        pages = []
+        remaining = limit
+        for shard in self.shards:
+            if remaining is not None and remaining <= 0:
+                break
+            size = shard.count()
+            if offset >= size:
+                offset -= size
+                continue
+            page = shard.get(limit=remaining, offset=offset, include=include)
+            pages.append(page)
+            if remaining is not None:
+                remaining -= len(page.get("ids") or [])
+            offset = 0
+        return concat_shard_gets(pages)
+
+    def _scatter(self, op: str, fn: Callable[[VectorCollection], Any]) -> List[Any]:
+        return self._run(op, [(shard, (lambda shard=shard: fn(shard))) for shard in self.shards])
+
+    def _run(self, op: str, calls: List[tuple]) -> List[Any]:
+        """Run (shard, thunk) pairs in parallel; re-raises the first failure after all finished."""
+        def timed(shard, thunk):
+            started = time.perf_counter()
+            try:
+                result = thunk()
+            except Exception:
+                self._stats.record(shard.name, op if op in OP_COUNTERS else "query", (time.perf_counter() - started) * 1000, error=True)
+                raise
+            if op in OP_COUNTERS:
+                self._stats.record(shard.name, op, (time.perf_counter() - started) * 1000)
+            return result
+
+        if len(calls) == 1:
+            return [timed(*calls[0])]
+        futures = [self._executor.submit(timed, shard, thunk) for shard, thunk in calls]
+        results, error = [], None
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                error = error or e
+                results.append(None)
+        if error is not None:
+            raise error
+        return results
+
+
+class ShardedVectorStore(VectorStore):
+    """Wraps a VectorStore so the collections in `shard_counts` are sharded; others pass through."""
+
+    def __init__(self, inner: VectorStore, shard_counts: Dict[str, int], shard_key: str = "hash",
+                 workers: int = 16):
+        if shard_key not in SHARD_KEYS:
+            raise ValueError(f"Unknown shard key '{shard_key}' (choose from {', '.join(SHARD_KEYS)})")
+        self.inner = inner
+        self.backend = inner.backend
+        self.shard_counts = dict(shard_counts)
+        self.shard_key = shard_key
+        self.stats = ShardStats()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vector-shard")
+
+    def shard_count(self, name: str) -> int:
+        return self.shard_counts.get(name, 1)
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Metadata] = None) -> VectorCollection:
+        targets = self._write_names(name)
+        extra = [n for n in self._physical_names(name) if n not in targets]
+        if targets == [name] and not extra:
+            return self.inner.get_or_create_collection(name, metadata=metadata)
+        shards = [self.inner.get_or_create_collection(n, metadata=metadata) for n in targets]
+        return self._sharded(name, shards, extra)
+
+    def get_collection(self, name: str) -> VectorCollection:
+        names = self._physical_names(name)
+        if not names or names == [name]:
+            return self.inner.get_collection(name)  # raises the backend's not-found error when missing
+        targets = [n for n in self._write_names(name) if n in names]
+        return self._sharded(name, [self.inner.get_collection(n) for n in targets],
+                             [n for n in names if n not in targets])
+
+    def delete_collection(self, name: str):
+        names = self._physical_names(name)
+        if not names:
+            self.inner.delete_collection(name)  # raises the backend's not-found error
+        for physical in names:
+            self.inner.delete_collection(physical)
+        self.stats.forget(names)
+
+    def list_collections(self) -> List[str]:
+        seen, names = set(), []
+        for name in self.inner.list_collections():
+            name = logical_name(name)
+            if name not in seen:
+                seen.add(name)
+                names.append(name)
+        return names
+
+    def heartbeat(self) -> bool:
+        return self.inner.heartbeat()
+
+    def sharded_collections(self) -> List[str]:
+        """Logical names that are configured for sharding or have shards on disk."""
+        on_disk = {logical_name(n) for n in self.inner.list_collections() if is_shard(n)}
+        return sorted(on_disk | set(self.shard_counts))
+
+    def snapshot(self) -> Dict[str, Any]:
+        collections = {}
+        for name in self.sharded_collections():
+            try:
+                collection = self.get_collection(name)
+            except Exception as e:
+                collections[name] = {"error": str(e), "configured_shards": self.shard_count(name)}
+                continue
+            shards = collection.shard_stats() if isinstance(collection, ShardedCollection) else []
+            collections[name] = {
+                "configured_shards": self.shard_count(name),
+                "total": sum(s["count"] for s in shards),
+                "shards": shards,
+            }
+        return {"shard_key": self.shard_key, "collections": collections}
+
+    def _sharded(self, name: str, shards: List[VectorCollection], extra: List[str]) -> "ShardedCollection":
+        write_count = len(shards)
+        shards = shards + [self.inner.get_collection(n) for n in extra]
+        if write_count == 0:
+            write_count = len(shards)  # read-only view; writes would land in the existing collections
+        return ShardedCollection(name, shards, write_count, self.shard_key, self._executor, self.stats)
+
+    def _physical_names(self, name: str) -> List[str]:
+        return sorted(n for n in self.inner.list_collections() if logical_name(n) == name)
+
+    def _write_names(self, name: str) -> List[str]:
+        count = self.shard_count(name)
+        return [shard_name(name, i) for i in range(count)] if count > 1 else [name]
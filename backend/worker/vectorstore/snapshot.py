@@ -0,0 +1,262 @@
+# worker/vectorstore/snapshot.py
+"""
+Collection snapshots: ids, embeddings, documents and metadata on disk, so a
+collection is restored (or a new replica seeded) without re-embedding.
+
+A snapshot is a directory of parts plus a manifest:
+
+    manifest.json            collection, count, dimension, collection metadata
+                             (HNSW settings) and the sha256 of every part file
+    part-00000.npy           float32 embeddings, one row per chunk
+    part-00000.jsonl.gz      {"id", "document", "metadata"} per chunk, same order
+
+Exports page through the collection and write to <dir>.partial, renamed once
+complete. Imports verify every checksum (and the embedding dimension against
+the target collection) before writing or replacing anything, then upsert in
+large batches (re-running an interrupted import is safe).
+
+    python -m vectorstore.snapshot export --org-id 1 --out /data/snapshots/org1
+    python -m vectorstore.snapshot import /data/snapshots/org1 --host replica-chroma
+    python -m vectorstore.snapshot verify /data/snapshots/org1
+
+Run from backend/worker. After a CLI import into the worker's own store, rebuild
+the derived indexes (POST /admin/blind-index/rebuild, /admin/lexical-index/rebuild);
+the worker's /admin/snapshots/restore does that itself.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(directory: str) -> Dict[str, Any]:
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        raise SnapshotError(f"No snapshot manifest in {directory}")
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format_version')} in {directory}")
+    return manifest
+
+
+def verify_snapshot(directory: str, manifest: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Check every part file against the manifest checksums, counts and dimension."""
+    manifest = manifest or load_manifest(directory)
+    total = 0
+    for part in manifest["parts"]:
+        for key in ("embeddings", "records"):
+            path = os.path.join(directory, part[key])
+            if not os.path.exists(path):
+                raise SnapshotError(f"Missing snapshot file {part[key]}")
+            if file_sha256(path) != part["sha256"][key]:
+                raise SnapshotError(f"Checksum mismatch in {part[key]}")
+        shape = np.load(os.path.join(directory, part["embeddings"]), mmap_mode="r").shape
+        if shape != (part["count"], manifest["dimension"]):
+            raise SnapshotError(f"{part['embeddings']} holds {shape}, manifest says "
+                                f"{part['count']} x {manifest['dimension']}")
+        total += part["count"]
+    if total != manifest["count"]:
+        raise SnapshotError(f"Parts hold {total} chunks, manifest says {manifest['count']}")
+    return manifest
+
+
+def check_dimension(collection, manifest: Dict[str, Any]):
+    """Refuse a snapshot whose embeddings don't match those already stored in `collection`."""
+    page = collection.get(include=["embeddings"], limit=1)
+    embeddings = page.get("embeddings")
+    if embeddings is None or len(embeddings) == 0 or manifest["dimension"] is None:
+        return
+    if len(embeddings[0]) != manifest["dimension"]:
+        raise SnapshotError(f"Snapshot embeddings have {manifest['dimension']} dimensions, "
+                            f"{collection.name} stores {len(embeddings[0])}")
+
+
+def export_collection(collection, directory: str, part_size: int = 10000, page_size: int = 2000) -> Dict[str, Any]:
+    """Write a snapshot of `collection` to `directory` (which must not exist). Returns the manifest."""
+    if os.path.exists(directory):
+        raise SnapshotError(f"Snapshot directory {directory} already exists")
+    started = time.time()
+    staging = directory.rstrip("/") + ".partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    parts: List[Dict[str, Any]] = []
+    pending = {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+    dim = None
+
+    def write_part():
+        nonlocal dim
+        if not pending["ids"]:
+            return
+        embeddings = np.asarray(pending["embeddings"], dtype=np.float32)
+        if dim is None:
+            dim = int(embeddings.shape[1])
+        elif embeddings.shape[1] != dim:
+            raise SnapshotError(f"Embedding dimension changed from {dim} to {embeddings.shape[1]}")
+        stem = f"part-{len(parts):05d}"
+        np.save(os.path.join(staging, f"{stem}.npy"), embeddings)
+        with gzip.open(os.path.join(staging, f"{stem}.jsonl.gz"), "wt", encoding="utf-8", compresslevel=6) as f:
+            for item_id, document, metadata in zip(pending["ids"], pending["documents"], pending["metadatas"]):
+                f.write(json.dumps({"id": item_id, "document": document, "metadata": metadata}) + "\n")
+        files = {"embeddings": f"{stem}.npy", "records": f"{stem}.jsonl.gz"}
+        parts.append(dict(files, count=len(pending["ids"]),
+                          sha256={k: file_sha256(os.path.join(staging, v)) for k, v in files.items()}))
+        for values in pending.values():
+            values.clear()
+
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        ids = page.get("ids") or []
+        if not ids:
+            break
+        embeddings = page.get("embeddings")
+        if embeddings is None or len(embeddings) != len(ids):
+            raise SnapshotError(f"{collection.name} returned no embeddings at offset {offset}")
+        pending["ids"].extend(ids)
+        pending["embeddings"].extend(embeddings)
+        pending["documents"].extend(page.get("documents") or [None] * len(ids))
+        pending["metadatas"].extend(page.get("metadatas") or [None] * len(ids))
+        offset += len(ids)
+        if len(pending["ids"]) >= part_size:
+            write_part()
+    write_part()
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "collection": collection.name,
+        "metadata": dict(getattr(collection, "metadata", None) or {}),
+        "count": offset,
+        "dimension": dim,
+        "created_at": datetime.now().isoformat(),
+        "parts": parts,
+    }
+    with open(os.path.join(staging, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(staging, directory)
+    logger.info("[Snapshot] Exported %s: %d chunks in %d parts to %s (%.1fs)",
+                collection.name, offset, len(parts), directory, time.time() - started)
+    return manifest
+
+
+def iter_snapshot(directory: str, manifest: Dict[str, Any], batch_size: int) -> Iterator[Dict[str, Any]]:
+    """Batches of {"ids", "embeddings", "documents", "metadatas"} in snapshot order."""
+    for part in manifest["parts"]:
+        embeddings = np.load(os.path.join(directory, part["embeddings"]), mmap_mode="r")
+        with gzip.open(os.path.join(directory, part["records"]), "rt", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        if len(records) != len(embeddings) or len(records) != part["count"]:
+            raise SnapshotError(f"{part['records']} and {part['embeddings']} disagree on the chunk count")
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+            metadatas = [r["metadata"] for r in batch]
+            yield {
+                "ids": [r["id"] for r in batch],
+                "embeddings": np.asarray(embeddings[start:start + batch_size], dtype=np.float32).tolist(),
+                "documents": [r["document"] for r in batch],
+                "metadatas": metadatas if any(m is not None for m in metadatas) else None,
+            }
+
+
+def import_snapshot(directory: str, collection, batch_size: int = 4000, verify: bool = True) -> int:
+    """Upsert every chunk of a snapshot into `collection`. Returns chunks written."""
+    started = time.time()
+    manifest = load_manifest(directory)
+    if verify:
+        verify_snapshot(directory, manifest)
+    written = 0
+    for batch in iter_snapshot(directory, manifest, batch_size):
+        collection.upsert(ids=batch["ids"], embeddings=batch["embeddings"], documents=batch["documents"],
+                          metadatas=batch["metadatas"])
+        written += len(batch["ids"])
+        logger.info("[Snapshot] %s: %d/%d chunks loaded", collection.name, written, manifest["count"])
+    logger.info("[Snapshot] Imported %s into %s: %d chunks in %.1fs",
+                directory, collection.name, written, time.time() - started)
+    return written
+
+
+def main(argv=None) -> int:
+    from vectorstore.chroma_store import BACKENDS, create_vector_store
+
+    p = argparse.ArgumentParser(description="Export, import or verify collection snapshots")
+    p.add_argument("--backend", default=os.getenv("VECTOR_STORE_BACKEND", "http"), choices=BACKENDS)
+    p.add_argument("--host", default=os.getenv("CHROMADB_HOST", "chromadb"))
+    p.add_argument("--port", type=int, default=int(os.getenv("CHROMADB_PORT", 8000)))
+    p.add_argument("--path", default=os.getenv("VECTOR_STORE_PATH", "/data/chroma"), help="embedded store directory")
+    p.add_argument("--log-level", default="INFO")
+    commands = p.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export")
+    target = export.add_mutually_exclusive_group(required=True)
+    target.add_argument("--org-id", type=int)
+    target.add_argument("--collection")
+    export.add_argument("--out", help="snapshot directory (default $SNAPSHOT_DIR/<collection>-<timestamp>)")
+    export.add_argument("--part-size", type=int, default=10000)
+
+    restore = commands.add_parser("import")
+    restore.add_argument("snapshot")
+    restore.add_argument("--collection", help="target collection (default: the exported one)")
+    restore.add_argument("--replace", action="store_true", help="delete the target collection first")
+    restore.add_argument("--batch-size", type=int, default=4000)
+
+    verify = commands.add_parser("verify")
+    verify.add_argument("snapshot")
+
+    args = p.parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level))
+
+    if args.command == "verify":
+        manifest = verify_snapshot(args.snapshot)
+        print(json.dumps({k: manifest[k] for k in ("collection", "count", "dimension", "created_at")}))
+        return 0
+
+    store = create_vector_store(args.backend, host=args.host, port=args.port, path=args.path)
+    if args.command == "export":
+        name = args.collection or f"privacy_documents_{args.org_id}"
+        out = args.out or os.path.join(os.getenv("SNAPSHOT_DIR", "/data/snapshots"),
+                                       f"{name}-{datetime.now():%Y%m%d-%H%M%S}")
+        manifest = export_collection(store.get_collection(name), out, part_size=args.part_size)
+        print(json.dumps({"snapshot": out, "collection": name, "count": manifest["count"]}))
+        return 0
+
+    manifest = verify_snapshot(args.snapshot)
+    name = args.collection or manifest["collection"]
+    if name in store.list_collections():
+        check_dimension(store.get_collection(name), manifest)
+        if args.replace:
+            store.delete_collection(name)
+    collection = store.get_or_create_collection(name, metadata=manifest["metadata"] or None)
+    written = import_snapshot(args.snapshot, collection, batch_size=args.batch_size, verify=False)
+    print(json.dumps({"snapshot": args.snapshot, "collection": name, "count": written}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,26 @@
+import os
+import json
+import urllib.request
+
 import chromadb
 
+WORKER_URL = os.getenv("WORKER_URL", "http://localhost:8001")
+COLLECTION = "privacy_documents_1"
+
 client = chromadb.HttpClient(host="localhost", port=8000)
-collection = client.get_collection("privacy_documents_1")
+collection = client.get_collection(COLLECTION)
 
 print(f"Collection: {collection.name}")
 print(f"Metadata: {collection.metadata}")
-print(f"Count: {collection.count()}")
+
+# Counts come from the worker's background stats instead of a count() scan
+try:
+    with urllib.request.urlopen(f"{WORKER_URL}/admin/collections/stats?name={COLLECTION}", timeout=5) as resp:
+        stats = json.load(resp)
+    print(f"Count: {stats['total']} (as of {stats['counted_at']})")
+    print(f"By access level: {stats['by_access_level']}")
+except Exception as e:
+    print(f"Worker stats unavailable ({e}); Count: {collection.count()}")
 
 # Check a sample document's embedding dimension
 sample = collection.get(limit=1, include=["embeddings"])
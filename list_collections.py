@@ -1,13 +1,33 @@
 
-import chromadb
 import os
+import json
+import urllib.request
+
+import chromadb
 
 CHROMADB_HOST = os.getenv("CHROMADB_HOST", "chromadb")
 CHROMADB_PORT = int(os.getenv("CHROMADB_PORT", 8000))
+WORKER_URL = os.getenv("WORKER_URL", "http://localhost:8001")
+
+
+def stats_from_worker():
+    """Counts kept in memory by the worker (no Chroma scan); None if unreachable."""
+    try:
+        with urllib.request.urlopen(f"{WORKER_URL}/admin/collections/stats", timeout=5) as resp:
+            return json.load(resp)
+    except Exception as e:
+        print(f"(worker stats unavailable: {e}; counting directly)")
+        return None
 
-client = chromadb.HttpClient(host=CHROMADB_HOST, port=CHROMADB_PORT)
-collections = client.list_collections()
 
-print(f"Found {len(collections)} collections:")
-for col in collections:
-    print(f"- {col.name} ({col.count()} items)")
+stats = stats_from_worker()
+if stats and stats.get("collections"):
+    print(f"Listing ALL collections and counts (as of {stats.get('last_refresh')}):")
+    for name, col in sorted(stats["collections"].items()):
+        print(f"- {name}: {col['total']} items  by access_level: {col.get('by_access_level')}")
+else:
+    client = chromadb.HttpClient(host=CHROMADB_HOST, port=CHROMADB_PORT)
+    print(f"Listing ALL collections and counts:")
+    for col in client.list_collections():
+        col = client.get_collection(col) if isinstance(col, str) else col
+        print(f"- {col.name}: {col.count()} items")
@@ -11,11 +11,11 @@ Start-Sleep -Seconds 30
 
 # 3. Ensure Requeue Script is present (robustness against container recreation)
 Write-Host "3. Restoring Checkpoint Logic..." -ForegroundColor Yellow
-docker cp .\backend\worker\requeue_silent.py privacy-aware-worker:/app/requeue_silent.py
+docker cp .\backend\worker\requeue.py privacy-aware-worker:/app/requeue.py
 
 # 4. Execute Resume Logic
 Write-Host "4. Resuming Queue (Finding all pending documents)..." -ForegroundColor Yellow
-docker exec privacy-aware-worker python /app/requeue_silent.py
+docker exec privacy-aware-worker python /app/requeue.py
 
 Write-Host "✅ Processing Resumed Successfully!" -ForegroundColor Green
 Write-Host "You can now run .\monitor_chroma.ps1 to watch progress." -ForegroundColor Gray